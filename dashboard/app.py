@@ -1,87 +1,197 @@
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import List, Optional, Tuple
+
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State
 import dash_bootstrap_components as dbc
+import flask
+import numpy as np
 import plotly.express as px
-import duckdb
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+from config import DashboardConfig
+from connection_manager import ConnectionManager
+from data_layer import MAX_MAP_CELL_ZOOM, DashboardQueries
+from aqi import AQI_BREAKPOINTS, AQI_CATEGORY_COLORS, aqi, aqi_category
+
+
+
+def map_viewport(relayout_data: Optional[dict]) -> Tuple[float, Optional[Tuple[float, float, float, float]]]:
+    """Zoom and (west, south, east, north) bounds of the map from its relayoutData
+
+    Until the user moves the map there are no bounds and the figure's initial zoom is returned.
+    """
+    relayout_data = relayout_data or {}
+    for prefix in ("mapbox", "map"):
+        corners = relayout_data.get(f"{prefix}._derived", {}).get("coordinates")
+        if f"{prefix}.zoom" in relayout_data and corners:
+            longitudes = [corner[0] for corner in corners]
+            latitudes = [corner[1] for corner in corners]
+            west, east = min(longitudes), max(longitudes)
+            if east - west >= 360:
+                west, east = -180.0, 180.0
+            else:
+                # Longitudes keep counting past +-180 when the map is panned around the globe
+                west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+            return relayout_data[f"{prefix}.zoom"], (west, min(latitudes), east, max(latitudes))
+    return 6.0, None
+
+
+def widen_viewport(zoom: float, bounds: Optional[Tuple[float, float, float, float]]) -> Optional[List[float]]:
+    """Bounds widened outward to whole cells of a coarser level, so small pans keep the same cells"""
+    if bounds is None:
+        return None
+    west, south, east, north = bounds
+    step = 360 / 2 ** max(0, min(MAX_MAP_CELL_ZOOM, int(zoom)) - 1)
+    widened_west, widened_east = math.floor(west / step) * step, math.ceil(east / step) * step
+    # A viewport crossing the antimeridian has west > east, widening moves its sides towards
+    # each other and once they meet the viewport covers every longitude
+    if west > east and widened_west <= widened_east:
+        widened_west, widened_east = -180.0, 180.0
+    return [
+        max(-180.0, widened_west),
+        max(-90.0, math.floor(south / step) * step),
+        min(180.0, widened_east),
+        min(90.0, math.ceil(north / step) * step),
+    ]
+
+
+def format_display_values(parameter: str, values: np.ndarray, aqi_values: np.ndarray) -> np.ndarray:
+    """Hover labels of a parameter's values, with their AQI and category where the parameter has one"""
+    if parameter not in AQI_BREAKPOINTS:
+        return values
+    return np.char.add(
+        np.char.add(np.char.mod("%.1f (AQI ", values), np.char.mod("%d, ", aqi_values)),
+        np.char.add(aqi_category(aqi_values).astype(str), ")")
+    )
 
 class AirQualityDashboard:
-    def __init__(self):
+    def __init__(
+        self,
+        db_path: str,
+        refresh_interval: float = 30.0,
+        snapshot_dir: Optional[str] = None
+    ):
+        # Measure cold start so growth in startup work shows up in the logs and /metrics
+        started = time.perf_counter()
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
         self.app = dash.Dash(
             __name__,
             external_stylesheets=[dbc.themes.BOOTSTRAP]
         )
-        self.db_path = "c:/Users/jeroe/AIR-QUALITY-MONITOR/air_quality.db"
+        self.db_path = db_path
+        # One read-only database handle per process, callbacks borrow cursors from its pool
+        self.connections = ConnectionManager.get(self.db_path, read_only=True)
+        self.queries = DashboardQueries(self.connections)
+        # Processes sharing a snapshot directory map one copy of the snapshot tables
+        self.snapshot_store = None
+        if snapshot_dir:
+            # Imported only when serving with a shared store, its fcntl locking is POSIX-only
+            from snapshot_store import SnapshotStore
+            self.snapshot_store = SnapshotStore(snapshot_dir)
+        self.refresh_interval = refresh_interval
         self.setup_initial_data()
         self.setup_layout()
         self.setup_callbacks()
+        self.setup_metrics()
+        self.start_snapshot_refresher()
+
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        if tracing:
+            tracemalloc.stop()
+        self.startup_stats = {
+            "seconds": round(time.perf_counter() - started, 4),
+            "peak_traced_mb": round(peak_bytes / 1024 / 1024, 2),
+        }
+        logging.info(
+            f"Dashboard started in {self.startup_stats['seconds']:.2f}s "
+            f"with {self.startup_stats['peak_traced_mb']:.1f} MB peak traced memory"
+        )
     
 
     def setup_initial_data(self):
-        """Initialize data from database"""
-        with duckdb.connect(self.db_path, read_only=True) as db_connection:
-            self.df = db_connection.execute(
-                "SELECT * FROM presentation.air_quality"
-            ).fetchdf()
-            self.daily_stats_df = db_connection.execute(
-                "SELECT * FROM presentation.daily_air_quality_stats"
-            ).fetchdf()
-            self.latest_values_df = db_connection.execute(
-                "SELECT * FROM presentation.latest_param_values_per_location"
-            ).fetchdf()
-            
-        # Rename columns to match expected names
-        self.latest_values_df.rename(columns={"lat": "latitude", "lon": "longitude"}, inplace=True)
+        """Read the location/parameter catalog, everything else is loaded on first use"""
+        self.catalog_df = self.queries.catalog().to_pandas()
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
 
-    def create_map_figure(self):
-        """Create the map figure with categorized PM2.5 values"""
-        self.latest_values_df.fillna(0, inplace=True)
-        
-        def categorize_pm25(value):
-            if value <= 12.0:
-                return "Good"
-            elif value <= 35.4:
-                return "Moderate"
-            elif value <= 55.4:
-                return "Unhealthy for Sensitive Groups"
-            else:
-                return "Unhealthy"
-        
-        # Create color mapping dictionary
-        color_map = {
-            "Good": "#00E400",  # Green
-            "Moderate": "#FFAA1C",  # Orange
-            "Unhealthy for Sensitive Groups": "#FF7E00",  # Dark Orange
-            "Unhealthy": "#FF0000"  # Red
-        }
-        
-        # Add air quality status column
-        self.latest_values_df["air_quality_status"] = self.latest_values_df["pm25"].apply(categorize_pm25)
+    def get_snapshot(self):
+        """Return the current snapshot, building the first one when a view first needs it"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.snapshot_lock:
+                if self.snapshot is None:
+                    self.snapshot = self.queries.snapshot(self.snapshot_store)
+                snapshot = self.snapshot
+        return snapshot
+
+    def start_snapshot_refresher(self):
+        """Start the background thread keeping the snapshot in step with the database"""
+        self.stop_refresher = threading.Event()
+        self.refresher = threading.Thread(target=self.refresh_snapshots, name="snapshot-refresher", daemon=True)
+        self.refresher.start()
+
+    def refresh_snapshots(self):
+        """Rebuild the snapshot when the pipeline has written new data, then swap it in"""
+        while not self.stop_refresher.wait(self.refresh_interval):
+            try:
+                # Nothing to refresh until a view has loaded the first snapshot
+                if self.snapshot is not None and self.queries.data_version() != self.snapshot.version:
+                    # Callbacks keep reading the previous snapshot until this assignment
+                    self.snapshot = self.queries.snapshot(self.snapshot_store)
+                    logging.info(f"Refreshed dashboard snapshot to data version {self.snapshot.version}")
+            except Exception as e:
+                logging.error(f"Error refreshing dashboard snapshot: {str(e)}")
+
+    def create_map_figure(self, cells: pa.Table):
+        """Create the map figure with grid cells of locations categorized by AQI"""
+        # Add air quality status and marker size columns, a cell grows with its location count
+        cells = cells.append_column("air_quality_status", pa.array(aqi_category(cells["aqi"].to_numpy(zero_copy_only=False))))
+        marker_sizes = 15 + 5 * np.log2(cells["location_count"].to_numpy())
+        cells = cells.append_column("marker_size", pa.array(marker_sizes))
         
         # Create the scatter mapbox figure
         map_fig = px.scatter_mapbox(
-        self.latest_values_df,
+        cells,
         lat="latitude",
         lon="longitude",
         hover_name="location",
         color="air_quality_status",
-        color_discrete_map=color_map,
+        color_discrete_map=AQI_CATEGORY_COLORS,
         hover_data={
             "latitude": ":.4f",
             "longitude": ":.4f",
             "datetime": True,
             "air_quality_status": True,
-            "pm25": ":.1f"
+            "aqi": ":.0f",
+            "pm25": ":.1f",
+            "marker_size": False
         },
         zoom=6.0,
-        size=[15] * len(self.latest_values_df),  # Set uniform size for all markers.
-        size_max=15  # Increase maximum marker size.
+        # Sizes are scaled so the largest marker is size_max pixels, which keeps them as computed.
+        # Plotly cannot scale the sizes of an empty viewport
+        size="marker_size" if cells.num_rows else None,
+        size_max=float(marker_sizes.max()) if cells.num_rows else 15
     )
         
         # Update the layout with enhanced styling.
         map_fig.update_layout(
         mapbox_style="open-street-map",
-        height=800,           
+        height=800,
+        # Keep the user's center and zoom when the cells of a new viewport are drawn
+        uirevision="map-view",
         legend_title={
             'text': "Air Quality Status",
             'font': {'size': 16, 'color': '#2c3e50'}
@@ -108,6 +218,10 @@ class AirQualityDashboard:
             interval=300000,  # 5 minutes in milliseconds
             n_intervals=0
         ),
+        # Width of the line plot in pixels, measured in the browser to size downsampling
+        dcc.Store(id="plot-width"),
+        # Data version, zoom level and viewport of the cells on the map
+        dcc.Store(id="map-state"),
 
         dbc.Alert(
             "Last updated: Auto-refresh every 5 minutes",
@@ -190,8 +304,8 @@ class AirQualityDashboard:
                                             clearable=False,
                                             multi=False,
                                             searchable=True,
-                                            options=self.df["location"].unique(),
-                                            value=self.df["location"].unique()[0],
+                                            options=self.catalog_df["location"].unique(),
+                                            value=self.catalog_df["location"].unique()[0],
                                             className="mb-3"
                                         ),
                                         html.Label(
@@ -204,8 +318,8 @@ class AirQualityDashboard:
                                             clearable=False,
                                             multi=False,
                                             searchable=True,
-                                            options=self.df["parameter"].unique(),
-                                            value=self.df["parameter"].unique()[0],
+                                            options=self.catalog_df["parameter"].unique(),
+                                            value=self.catalog_df["parameter"].unique()[0],
                                             className="mb-3"
                                         ),
                                         html.Label(
@@ -216,8 +330,8 @@ class AirQualityDashboard:
                                         dcc.DatePickerRange(
                                             id="date-picker-range",
                                             display_format="YYYY-MM-DD",
-                                            start_date=self.daily_stats_df["measurement_date"].min(),
-                                            end_date=self.daily_stats_df["measurement_date"].max(),
+                                            start_date=self.catalog_df["start_date"].min(),
+                                            end_date=self.catalog_df["end_date"].max(),
                                             className="mb-3"
                                         )
                                     ])
@@ -274,18 +388,22 @@ class AirQualityDashboard:
 
         # Map view callback
         @self.app.callback(
-            Output("map-view", "figure"),
-            [Input("map-view", "id"),
-             Input("interval-component", "n_intervals")]
+            [Output("map-view", "figure"),
+             Output("map-state", "data")],
+            [Input("map-view", "relayoutData"),
+             Input("interval-component", "n_intervals")],
+            State("map-state", "data")
         )
-        def update_map(_, n):
-            # Refresh data from database
-            with duckdb.connect(self.db_path, read_only=True) as db_connection:
-                self.latest_values_df = db_connection.execute(
-                    "SELECT * FROM presentation.latest_param_values_per_location"
-                ).fetchdf()
-                self.latest_values_df.rename(columns={"lat": "latitude", "lon": "longitude"}, inplace=True)
-            return self.create_map_figure()
+        def update_map(relayout_data, n, previous_state):
+            # Read the cells of the current viewport from the current snapshot
+            snapshot = self.get_snapshot()
+            zoom, bounds = map_viewport(relayout_data)
+            bounds = widen_viewport(zoom, bounds)
+            cells, level = snapshot.map_cells_in(zoom, bounds)
+            state = [snapshot.version, level, bounds]
+            if state == previous_state:
+                return dash.no_update, dash.no_update
+            return self.create_map_figure(cells), state
 
         # Dropdown options callback
         @self.app.callback(
@@ -298,33 +416,37 @@ class AirQualityDashboard:
                 Output("date-picker-range", "end_date"),
             ],
             [Input("location-dropdown", "id"),
-             Input("interval-component", "n_intervals")]
+             Input("interval-component", "n_intervals")],
+            [State("location-dropdown", "value"),
+             State("parameter-dropdown", "value"),
+             State("date-picker-range", "start_date"),
+             State("date-picker-range", "end_date")]
         )
-        def update_dropdowns(_, n):
-            with duckdb.connect(self.db_path, read_only=True) as db_connection:
-                df = db_connection.execute(
-                    "SELECT * FROM presentation.daily_air_quality_stats"
-                ).fetchdf()
-
-                location_options = [
-                    {"label": location, "value": location} 
-                    for location in df["location"].unique()
-                ]
-                parameter_options = [
-                    {"label": parameter, "value": parameter}
-                    for parameter in df["parameter"].unique()
-                ]
-                start_date = df["measurement_date"].min()
-                end_date = df["measurement_date"].max()
-
-                return (
-                    location_options,
-                    df["location"].unique()[0],
-                    parameter_options,
-                    df["parameter"].unique()[0],
-                    start_date,
-                    end_date,
-                )
+        def update_dropdowns(_, n, selected_location, selected_parameter, selected_start_date, selected_end_date):
+            catalog = self.get_snapshot().catalog
+            locations = pc.unique(catalog["location"]).to_pylist()
+            parameters = pc.unique(catalog["parameter"]).to_pylist()
+
+            location_options = [
+                {"label": location, "value": location} 
+                for location in locations
+            ]
+            parameter_options = [
+                {"label": parameter, "value": parameter}
+                for parameter in parameters
+            ]
+            start_date = pc.min(catalog["start_date"]).as_py()
+            end_date = pc.max(catalog["end_date"]).as_py()
+
+            # Keep the user's selections while they still exist in the data
+            return (
+                location_options,
+                selected_location if selected_location in locations else locations[0],
+                parameter_options,
+                selected_parameter if selected_parameter in parameters else parameters[0],
+                selected_start_date or start_date,
+                selected_end_date or end_date,
+            )
 
         # Unified plots callback
         @self.app.callback(
@@ -335,46 +457,41 @@ class AirQualityDashboard:
                 Input("parameter-dropdown", "value"),
                 Input("date-picker-range", "start_date"),
                 Input("date-picker-range", "end_date"),
-                Input("interval-component", "n_intervals")
+                Input("interval-component", "n_intervals"),
+                Input("plot-width", "data")
             ]
         )
-        def update_plots(selected_location, selected_parameter, start_date, end_date, n):
-            with duckdb.connect(self.db_path, read_only=True) as db_connection:
-                daily_stats_df = db_connection.execute(
-                    "SELECT * FROM presentation.daily_air_quality_stats"
-                ).fetchdf()
-
-            filtered_df = daily_stats_df[daily_stats_df["location"] == selected_location]
-            filtered_df = filtered_df[filtered_df["parameter"] == selected_parameter]
-            filtered_df = filtered_df[
-                (filtered_df["measurement_date"] >= pd.to_datetime(start_date))
-                & (filtered_df["measurement_date"] <= pd.to_datetime(end_date))
-            ]
-
-            def categorize_pm25(value):
-                if value <= 12.0:
-                    return f"{value:.1f} (Good)"
-                elif value <= 35.4:
-                    return f"{value:.1f} (Moderate)"
-                elif value <= 55.4:
-                    return f"{value:.1f} (Unhealthy for Sensitive Groups)"
-                else:
-                    return f"{value:.1f} (Unhealthy)"
-
-            if selected_parameter == "pm25":
-                filtered_df["display_value"] = filtered_df["average_value"].apply(categorize_pm25)
-            else:
-                filtered_df["display_value"] = filtered_df["average_value"]
+        def update_plots(selected_location, selected_parameter, start_date, end_date, n, plot_width):
+            # Sorted by measurement_date already, and shared with other callbacks so never modified
+            daily_stats = self.get_snapshot().daily_stats_between(selected_location, selected_parameter, start_date, end_date)
+            # AQI of the daily average, precomputed by the pipeline
+            daily_stats = daily_stats.append_column("display_value", pa.array(format_display_values(
+                selected_parameter,
+                daily_stats["average_value"].to_numpy(),
+                daily_stats["aqi"].to_numpy(zero_copy_only=False)
+            )))
 
+            units = daily_stats["units"]
             labels = {
-                "average_value": filtered_df["units"].unique()[0],
+                "average_value": units[0].as_py() if len(units) else "",
                 "measurement_date": "Date",
+                "period_start": "Date",
                 "display_value": f"{selected_parameter} Level"
             }
 
+            # Downsampled on the server to at most two points per pixel of the plot
+            series = self.queries.series(selected_location, selected_parameter, start_date, end_date, plot_width or 1000)
+            series_values = series["average_value"].to_numpy()
+            series_units = series["units"][0].as_py() if series.num_rows else None
+            series = series.append_column("display_value", pa.array(format_display_values(
+                selected_parameter,
+                series_values,
+                aqi(selected_parameter, series_values, series_units)
+            )))
+
             line_fig = px.line(
-                filtered_df.sort_values(by="measurement_date"),
-                x="measurement_date",
+                series,
+                x="period_start",
                 y="average_value",
                 labels=labels,
                 title=f"Plot Over Time of {selected_parameter} Levels",
@@ -388,9 +505,8 @@ class AirQualityDashboard:
                     "<extra></extra>"
                 ])
             )
-
             box_fig = px.box(
-                filtered_df.sort_values(by="weekday_number"),
+                daily_stats.sort_by("weekday_number"),
                 x="weekday",
                 y="average_value",
                 labels=labels,
@@ -408,10 +524,29 @@ class AirQualityDashboard:
 
             return line_fig, box_fig
 
+        # Plot width callback, run in the browser
+        self.app.clientside_callback(
+            """
+            function(n) {
+                const graph = document.getElementById("line-plot");
+                return graph ? graph.offsetWidth : window.innerWidth;
+            }
+            """,
+            Output("plot-width", "data"),
+            Input("interval-component", "n_intervals")
+        )
+
+    def setup_metrics(self):
+        """Expose result cache and connection pool counters at /metrics"""
+        self.app.server.add_url_rule("/metrics", "metrics", lambda: flask.jsonify(dict(self.queries.stats(), startup=self.startup_stats)))
+
     def run_server(self, debug=True):
         """Run the dashboard server"""
         self.app.run_server(debug=debug)
 
 if __name__ == "__main__":
-    dashboard = AirQualityDashboard()
+    # Same settings as wsgi.py, served by Dash's single-process development server
+    config = DashboardConfig.from_environment()
+    ConnectionManager.get(config.database_path, read_only=True, idle_timeout=config.idle_timeout)
+    dashboard = AirQualityDashboard(db_path=config.database_path, refresh_interval=config.refresh_interval)
     dashboard.run_server(debug=True)
\ No newline at end of file
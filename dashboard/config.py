@@ -0,0 +1,38 @@
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+class DashboardConfig(NamedTuple):
+    """Settings of a dashboard server process"""
+    database_path: str
+    refresh_interval: float
+    snapshot_dir: str
+    idle_timeout: Optional[float]
+
+    @classmethod
+    def from_environment(cls) -> "DashboardConfig":
+        """Read the settings from environment variables, DuckDB's own settings are read by ConnectionManager
+
+        AIR_QUALITY_DB_PATH             DuckDB file written by the pipeline, air_quality.db in the repository by default
+        DASHBOARD_REFRESH_INTERVAL      Seconds between data version checks, 30 by default
+        DASHBOARD_SNAPSHOT_DIR          Directory of the shared snapshot files, under /dev/shm by default
+        DASHBOARD_DB_IDLE_TIMEOUT       Seconds before an unused database handle is closed so the pipeline
+                                        can write, 2 by default, `none` holds it for the worker's lifetime
+        """
+        database_path = os.path.abspath(os.environ.get("AIR_QUALITY_DB_PATH", os.path.join(REPOSITORY_ROOT, "air_quality.db")))
+        # One directory per database, so dashboards of different databases never share versions
+        shared_memory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        default_snapshot_dir = os.path.join(
+            shared_memory, f"air-quality-dashboard-{hashlib.sha1(database_path.encode()).hexdigest()[:8]}"
+        )
+        idle_timeout = os.environ.get("DASHBOARD_DB_IDLE_TIMEOUT", "2")
+        return cls(
+            database_path=database_path,
+            refresh_interval=float(os.environ.get("DASHBOARD_REFRESH_INTERVAL", "30")),
+            snapshot_dir=os.environ.get("DASHBOARD_SNAPSHOT_DIR", default_snapshot_dir),
+            idle_timeout=None if idle_timeout.lower() == "none" else float(idle_timeout),
+        )
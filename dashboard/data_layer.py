@@ -0,0 +1,276 @@
+import math
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from connection_manager import ConnectionManager
+from result_cache import ResultCache
+
+if TYPE_CHECKING:
+    # fcntl based, so not imported on Windows
+    from snapshot_store import SnapshotStore
+
+# Each query selects only the columns its figure uses and takes filters as bound parameters,
+# so the statement text never changes between callbacks. Results are fetched as Arrow tables
+# and handed to Plotly as they are.
+MAP_CELLS_QUERY = """
+    SELECT
+        zoom,
+        latitude,
+        longitude,
+        location,
+        location_count,
+        -- Hover text only, formatted here so the map's hover columns need no datetime conversion
+        strftime("datetime", '%Y-%m-%d %H:%M:%S') AS "datetime",
+        pm25,
+        aqi
+    FROM presentation.map_cells
+    ORDER BY zoom, cell_x, cell_y
+"""
+# Levels binned by the pipeline, deeper zooms show the cells of the last one
+MAX_MAP_CELL_ZOOM = 14
+# A viewport showing more cells than this is drawn from coarser levels
+MAX_MAP_CELLS = 2000
+CATALOG_QUERY = """
+    SELECT location, parameter, start_date, end_date
+    FROM presentation.dashboard_catalog
+    ORDER BY location, parameter
+"""
+# Every refresh of a table bumps its counter, so the sum changes whenever any data changes
+DATA_VERSION_QUERY = """
+    SELECT coalesce(sum("version"), 0) FROM raw.table_versions
+"""
+DAILY_STATS_INDEX_QUERY = """
+    SELECT location, parameter, measurement_date, weekday_number, weekday, units, average_value, aqi
+    FROM presentation.daily_air_quality_stats
+    ORDER BY location, parameter, measurement_date
+"""
+# Rollups the line plot reads, finest first, with the length of their periods
+SERIES_ROLLUPS = [
+    ("presentation.air_quality_hourly", timedelta(hours=1)),
+    ("presentation.air_quality_daily", timedelta(days=1)),
+    ("presentation.air_quality_monthly", timedelta(days=31)),
+]
+# The finest rollup with at most this many periods per plotted point is read, so long ranges
+# scan few rows. Buckets take the extremes the rollups store, so any rollup keeps the peaks
+SERIES_SCAN_FACTOR = 10
+MAX_SERIES_POINTS = 2000
+SERIES_QUERY = """
+    -- Min/max bucketing: every bucket of $bucket_seconds keeps the period with its lowest and
+    -- the period with its highest reading, from the extremes each rollup period stores, so
+    -- peaks survive downsampling whichever rollup is read. Buckets of one period return its average.
+    WITH series AS (
+        SELECT
+            period_start,
+            sum(value_sum) / sum(value_count) AS average_value,
+            min(value_min) AS value_min,
+            max(value_max) AS value_max,
+            any_value(units) AS units
+        FROM {rollup}
+        WHERE location_id IN (SELECT location_id FROM raw.locations WHERE "location" = $location)
+        AND parameter = $parameter
+        AND period_start >= $start
+        AND period_start < $end
+        GROUP BY period_start
+    ),
+    buckets AS (
+        SELECT
+            any_value(units) AS units,
+            count(*) AS period_count,
+            any_value(average_value) AS average_value,
+            arg_min(period_start, value_min) AS min_start,
+            min(value_min) AS min_value,
+            arg_max(period_start, value_max) AS max_start,
+            max(value_max) AS max_value
+        FROM series
+        GROUP BY floor(epoch(period_start) / $bucket_seconds)
+    )
+    SELECT min_start AS period_start, CASE WHEN period_count = 1 THEN average_value ELSE min_value END AS average_value, units
+    FROM buckets
+    UNION
+    SELECT max_start, CASE WHEN period_count = 1 THEN average_value ELSE max_value END, units
+    FROM buckets
+    ORDER BY period_start
+"""
+SERIES_QUERIES = {rollup: SERIES_QUERY.format(rollup=rollup) for rollup, _ in SERIES_ROLLUPS}
+
+DateLike = Union[str, date]
+
+MAP_CELLS_EMPTY = pa.table({
+    "latitude": pa.array([], pa.float64()),
+    "longitude": pa.array([], pa.float64()),
+    "location": pa.array([], pa.string()),
+    "location_count": pa.array([], pa.int64()),
+    "datetime": pa.array([], pa.string()),
+    "pm25": pa.array([], pa.float64()),
+    "aqi": pa.array([], pa.int32()),
+})
+
+
+def to_date(value: DateLike) -> date:
+    """Parse a date picker value"""
+    return pd.to_datetime(value).date()
+
+
+class DashboardSnapshot(NamedTuple):
+    """Everything the dashboard views read, built in one pass and never modified afterwards"""
+    version: int
+    map_cells: Dict[int, pa.Table]
+    catalog: pa.Table
+    daily_stats: Dict[Tuple[str, str], pa.Table]
+
+    def map_cells_in(self, zoom: float, bounds: Optional[Tuple[float, float, float, float]] = None) -> Tuple[pa.Table, int]:
+        """Map cells within (west, south, east, north) bounds and the zoom level they were binned at
+
+        Levels coarser than `zoom` are used while the viewport holds more than MAX_MAP_CELLS cells.
+        """
+        level = max(0, min(MAX_MAP_CELL_ZOOM, int(zoom)))
+        while True:
+            cells = self.map_cells.get(level)
+            if cells is None:
+                return MAP_CELLS_EMPTY, level
+            if bounds is not None:
+                west, south, east, north = bounds
+                latitudes, longitudes = cells["latitude"], cells["longitude"]
+                in_latitude = pc.and_(pc.greater_equal(latitudes, south), pc.less_equal(latitudes, north))
+                if west <= east:
+                    in_longitude = pc.and_(pc.greater_equal(longitudes, west), pc.less_equal(longitudes, east))
+                else:
+                    # The viewport crosses the antimeridian
+                    in_longitude = pc.or_(pc.greater_equal(longitudes, west), pc.less_equal(longitudes, east))
+                cells = cells.filter(pc.and_(in_latitude, in_longitude))
+            if cells.num_rows <= MAX_MAP_CELLS or level == 0:
+                return cells, level
+            level -= 1
+
+    def daily_stats_between(self, location: str, parameter: str, start_date: DateLike, end_date: DateLike) -> pa.Table:
+        """Daily averages of one location and parameter within a date range"""
+        table = self.daily_stats.get((location, parameter))
+        if table is None:
+            return pa.table({
+                "measurement_date": pa.array([], pa.date32()),
+                "weekday_number": pa.array([], pa.int64()),
+                "weekday": pa.array([], pa.string()),
+                "units": pa.array([], pa.string()),
+                "average_value": pa.array([], pa.float64()),
+                "aqi": pa.array([], pa.int32()),
+            })
+        dates = table["measurement_date"]
+        return table.filter(pc.and_(
+            pc.greater_equal(dates, pa.scalar(to_date(start_date))),
+            pc.less_equal(dates, pa.scalar(to_date(end_date)))
+        ))
+
+
+class DashboardQueries:
+    def __init__(self, connections: ConnectionManager, cache: Optional[ResultCache] = None, version_ttl: float = 5.0):
+        """Parameterized, projected queries behind the dashboard figures
+
+        Results are cached per query, parameters and data version. The data version is read
+        at most once every `version_ttl` seconds.
+        """
+        self.connections = connections
+        self.cache = cache if cache is not None else ResultCache()
+        self.version_ttl = version_ttl
+        self.version_lock = threading.Lock()
+        self.version = None
+        self.version_checked_at = 0.0
+
+    def data_version(self) -> int:
+        """Current data version written by the pipeline"""
+        with self.version_lock:
+            if self.version is None or time.monotonic() - self.version_checked_at > self.version_ttl:
+                with self.connections.cursor() as connection:
+                    self.version = connection.execute(DATA_VERSION_QUERY).fetchone()[0]
+                self.version_checked_at = time.monotonic()
+            return self.version
+
+    def run(self, query: str, parameters: Optional[Dict[str, object]] = None) -> pa.Table:
+        """Run a query through the result cache, Arrow tables are immutable so callers share results"""
+        key = (query, tuple(sorted((parameters or {}).items())), self.data_version())
+
+        def fetch() -> pa.Table:
+            with self.connections.cursor() as connection:
+                return connection.execute(query, parameters).fetch_arrow_table()
+
+        return self.cache.get_or_compute(key, fetch)
+
+    def catalog(self) -> pa.Table:
+        """Locations and parameters with daily stats and the dates they cover"""
+        return self.run(CATALOG_QUERY)
+
+    def series(
+        self, location: str, parameter: str, start_date: DateLike, end_date: DateLike, plot_width: int = 1000
+    ) -> pa.Table:
+        """Average values of one location and parameter downsampled for a plot `plot_width` pixels wide
+
+        At most two points per pixel and never more than MAX_SERIES_POINTS are returned.
+        """
+        start = datetime.combine(to_date(start_date), datetime.min.time())
+        end = datetime.combine(to_date(end_date), datetime.min.time()) + timedelta(days=1)
+        # Widths are rounded so resizes by a few pixels reuse cached results
+        max_points = min(MAX_SERIES_POINTS, 2 * max(100, plot_width // 100 * 100))
+        rollup, period = next(
+            ((rollup, period) for rollup, period in SERIES_ROLLUPS if (end - start) / period <= SERIES_SCAN_FACTOR * max_points),
+            SERIES_ROLLUPS[-1]
+        )
+        bucket_seconds = max(period.total_seconds(), math.ceil((end - start).total_seconds() / (max_points // 2)))
+        return self.run(SERIES_QUERIES[rollup], {
+            "location": location,
+            "parameter": parameter,
+            "start": start,
+            "end": end,
+            "bucket_seconds": bucket_seconds,
+        })
+
+    def read_snapshot_tables(self) -> Tuple[int, Dict[str, pa.Table]]:
+        """Read the tables of every view and their data version in one transaction"""
+        with self.connections.cursor() as connection:
+            connection.begin()
+            try:
+                version = connection.execute(DATA_VERSION_QUERY).fetchone()[0]
+                tables = {
+                    "map_cells": connection.execute(MAP_CELLS_QUERY).fetch_arrow_table(),
+                    "catalog": connection.execute(CATALOG_QUERY).fetch_arrow_table(),
+                    "daily_stats": connection.execute(DAILY_STATS_INDEX_QUERY).fetch_arrow_table(),
+                }
+            finally:
+                connection.rollback()
+        return version, tables
+
+    def snapshot(self, store: Optional["SnapshotStore"] = None) -> DashboardSnapshot:
+        """Build a consistent snapshot of every view's data, mapped from a shared store when given"""
+        if store is None:
+            version, tables = self.read_snapshot_tables()
+        else:
+            version, tables = store.get_or_build(self.data_version(), self.read_snapshot_tables)
+        return DashboardSnapshot(
+            version,
+            {zoom: cells for (zoom,), cells in self.split_sorted(tables["map_cells"], ["zoom"]).items()},
+            tables["catalog"],
+            self.split_sorted(tables["daily_stats"], ["location", "parameter"])
+        )
+
+    @staticmethod
+    def split_sorted(table: pa.Table, keys: List[str]) -> Dict[tuple, pa.Table]:
+        """Split a table sorted by its key columns into zero-copy slices per key"""
+        # Without threads, groups come out in the order they first appear, which is the sort order
+        groups = table.group_by(keys, use_threads=False).aggregate([([], "count_all")])
+        values = table.drop_columns(keys)
+        index = {}
+        start = 0
+        for key, row_count in zip(
+            zip(*(groups[key].to_pylist() for key in keys)), groups["count_all"].to_pylist()
+        ):
+            index[key] = values.slice(start, row_count)
+            start += row_count
+        return index
+
+    def stats(self) -> Dict[str, object]:
+        """Cache and connection pool counters"""
+        return {"cache": self.cache.stats(), "pool": self.connections.stats()}
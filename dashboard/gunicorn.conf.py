@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("DASHBOARD_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("DASHBOARD_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Callbacks spend most of their time in DuckDB, pyarrow and Plotly, so threads overlap well
+worker_class = "gthread"
+threads = int(os.environ.get("DASHBOARD_THREADS", 4))
+timeout = 60
+# DuckDB handles and the snapshot refresher thread do not survive a fork, so every worker
+# imports the app itself instead of inheriting it from a preloaded master
+preload_app = False
+accesslog = "-"
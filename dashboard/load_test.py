@@ -0,0 +1,151 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+from typing import Dict, List
+
+import numpy as np
+
+
+class DashboardLoadTest:
+    def __init__(self, url: str, users: int, duration: float, timeout: float = 60.0):
+        """Simulated users calling the dashboard's plot and map callbacks back to back over HTTP"""
+        self.url = url.rstrip("/")
+        self.users = users
+        self.duration = duration
+        self.timeout = timeout
+        self.latencies: Dict[str, List[float]] = {"plots": [], "map": []}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def request(self, path: str, payload: dict = None) -> dict:
+        """GET a path, or POST a JSON payload to it, and decode the JSON response"""
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(f"{self.url}{path}", data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    @staticmethod
+    def find_component(layout: dict, component_id: str) -> dict:
+        """Props of the component with an id in a Dash layout"""
+        stack = [layout]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if node.get("props", {}).get("id") == component_id:
+                    return node["props"]
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(node)
+        raise ValueError(f"No component {component_id} in the dashboard layout")
+
+    def plots_payload(self, location: str, parameter: str, start_date: str, end_date: str) -> dict:
+        """Callback request of the line and box plots"""
+        return {
+            "output": "..line-plot.figure...box-plot.figure..",
+            "outputs": [{"id": "line-plot", "property": "figure"}, {"id": "box-plot", "property": "figure"}],
+            "inputs": [
+                {"id": "location-dropdown", "property": "value", "value": location},
+                {"id": "parameter-dropdown", "property": "value", "value": parameter},
+                {"id": "date-picker-range", "property": "start_date", "value": start_date},
+                {"id": "date-picker-range", "property": "end_date", "value": end_date},
+                {"id": "interval-component", "property": "n_intervals", "value": 0},
+                {"id": "plot-width", "property": "data", "value": 1200},
+            ],
+            "changedPropIds": ["location-dropdown.value"],
+            "state": [],
+        }
+
+    @staticmethod
+    def map_payload(zoom: float, longitude: float, latitude: float) -> dict:
+        """Callback request of the map for a 1400 x 800 pixel viewport"""
+        half_width = 1400 / 256 * 360 / 2 ** zoom / 2
+        half_height = min(85.0, 800 / 256 * 360 / 2 ** zoom / 2)
+        corners = [
+            [longitude - half_width, latitude + half_height],
+            [longitude + half_width, latitude + half_height],
+            [longitude + half_width, latitude - half_height],
+            [longitude - half_width, latitude - half_height],
+        ]
+        return {
+            "output": "..map-view.figure...map-state.data..",
+            "outputs": [{"id": "map-view", "property": "figure"}, {"id": "map-state", "property": "data"}],
+            "inputs": [
+                {"id": "map-view", "property": "relayoutData", "value": {
+                    "mapbox.center": {"lon": longitude, "lat": latitude},
+                    "mapbox.zoom": zoom,
+                    "mapbox._derived": {"coordinates": corners},
+                }},
+                {"id": "interval-component", "property": "n_intervals", "value": 0},
+            ],
+            "changedPropIds": ["map-view.relayoutData"],
+            "state": [{"id": "map-state", "property": "data", "value": None}],
+        }
+
+    def user(self, deadline: float, selections: List[tuple]) -> None:
+        """Alternate plot and map callbacks with random selections until the deadline"""
+        generator = random.Random()
+        while time.monotonic() < deadline:
+            for name, payload in (
+                ("plots", self.plots_payload(*generator.choice(selections))),
+                ("map", self.map_payload(generator.uniform(2, 14), generator.uniform(-180, 180), generator.uniform(-60, 60))),
+            ):
+                started = time.perf_counter()
+                try:
+                    self.request("/_dash-update-component", payload)
+                except Exception as e:
+                    with self.lock:
+                        self.errors += 1
+                    logging.error(f"{name} callback failed: {str(e)}")
+                    continue
+                with self.lock:
+                    self.latencies[name].append(time.perf_counter() - started)
+
+    def run(self) -> Dict[str, Dict[str, float]]:
+        """Run every user concurrently for the duration and summarize the latencies"""
+        layout = self.request("/_dash-layout")
+        # Options are plain values or {"label", "value"} dicts
+        locations, parameters = (
+            [option["value"] if isinstance(option, dict) else option for option in self.find_component(layout, dropdown)["options"]]
+            for dropdown in ("location-dropdown", "parameter-dropdown")
+        )
+        date_picker = self.find_component(layout, "date-picker-range")
+        start_date, end_date = date_picker["start_date"], date_picker["end_date"]
+        selections = [(location, parameter, start_date, end_date) for location in locations for parameter in parameters]
+
+        deadline = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self.user, args=(deadline, selections)) for _ in range(self.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report = {}
+        for name, latencies in list(self.latencies.items()) + [("all", sum(self.latencies.values(), []))]:
+            milliseconds = np.array(latencies) * 1000
+            report[name] = {
+                "requests": len(latencies),
+                "per_second": round(len(latencies) / self.duration, 1),
+                "p50_ms": round(float(np.percentile(milliseconds, 50)), 1) if len(latencies) else None,
+                "p99_ms": round(float(np.percentile(milliseconds, 99)), 1) if len(latencies) else None,
+            }
+        report["errors"] = self.errors
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard callbacks with concurrent users.")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8050", help="Base URL of a running dashboard")
+    parser.add_argument("--users", type=int, default=10, help="Number of concurrent users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run the test for")
+    args = parser.parse_args()
+
+    report = DashboardLoadTest(args.url, args.users, args.duration).run()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
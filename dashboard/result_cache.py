@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Tuple
+
+import pyarrow as pa
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """LRU cache of Arrow query results bounded by their in-memory size
+
+        Keys carry the data version they were computed at, so entries of older versions are
+        never hit again and age out through LRU eviction. Concurrent misses on the same key
+        share one computation.
+        """
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, Tuple[pa.Table, int]]" = OrderedDict()
+        self.pending: Dict[Hashable, Future] = {}
+        self.lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], pa.Table]) -> pa.Table:
+        """Return the cached result of a key, computing it once if absent"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            future = self.pending.get(key)
+            computing = future is None
+            if computing:
+                self.misses += 1
+                future = self.pending[key] = Future()
+            else:
+                self.coalesced += 1
+        if not computing:
+            return future.result()
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.pending[key]
+            self.store(key, result)
+        future.set_result(result)
+        return result
+
+    def store(self, key: Hashable, result: pa.Table) -> None:
+        """Insert a result and evict least recently used ones past the size limit, the caller holds the lock"""
+        size = result.nbytes
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (result, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, object]:
+        """Snapshot of the cache counters"""
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
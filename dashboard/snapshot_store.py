@@ -0,0 +1,95 @@
+import fcntl
+import glob
+import logging
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import pyarrow as pa
+
+# Tables of a snapshot, one Arrow IPC file each
+SNAPSHOT_TABLES = ("map_cells", "catalog", "daily_stats")
+
+
+class SnapshotStore:
+    def __init__(self, directory: str):
+        """Snapshot tables shared by the dashboard processes of one host as memory-mapped Arrow files
+
+        One process per data version reads the tables from DuckDB and writes them, every other
+        process maps the same files. Mapped tables are backed by the page cache, so the
+        processes share one copy of the data instead of holding a copy each. Put the directory
+        on a tmpfs such as /dev/shm to keep the files out of the disk. Locking uses fcntl, so the
+        store is only available on POSIX systems, like the gunicorn server that uses it.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, version: int, table: str) -> str:
+        """Path of one table of a data version"""
+        return os.path.join(self.directory, f"snapshot-{version}-{table}.arrow")
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the store's lock across processes"""
+        with open(os.path.join(self.directory, "snapshot.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, version: int) -> Optional[Dict[str, pa.Table]]:
+        """Map the tables of a data version, None when they have not been written"""
+        # The last table is renamed into place last, so its presence means all are complete
+        if not os.path.exists(self.path(version, SNAPSHOT_TABLES[-1])):
+            return None
+        tables = {}
+        try:
+            for table in SNAPSHOT_TABLES:
+                with pa.memory_map(self.path(version, table)) as source:
+                    tables[table] = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            # Pruned by a process that stored a newer version
+            return None
+        return tables
+
+    def save(self, version: int, tables: Dict[str, pa.Table]) -> None:
+        """Write the tables of a data version, each under a temporary name renamed into place"""
+        for table in SNAPSHOT_TABLES:
+            temporary_path = f"{self.path(version, table)}.tmp"
+            with pa.OSFile(temporary_path, "wb") as sink:
+                with pa.ipc.new_file(sink, tables[table].schema) as writer:
+                    writer.write_table(tables[table])
+            os.replace(temporary_path, self.path(version, table))
+        logging.info(f"Stored dashboard snapshot of data version {version} at {self.directory}")
+
+    def prune(self, keep_version: int) -> None:
+        """Remove the files of other data versions, processes that still map them keep their data"""
+        for path in glob.glob(os.path.join(self.directory, "snapshot-*.arrow*")):
+            if not os.path.basename(path).startswith(f"snapshot-{keep_version}-"):
+                os.remove(path)
+
+    def get_or_build(
+        self, version: int, build: Callable[[], Tuple[int, Dict[str, pa.Table]]]
+    ) -> Tuple[int, Dict[str, pa.Table]]:
+        """Map the tables of a data version, building and storing them in one process if missing
+
+        `build` returns the tables with the data version they were read at, which may be newer
+        than the version asked for.
+        """
+        tables = self.load(version)
+        if tables is not None:
+            return version, tables
+        with self.locked():
+            # Another process may have stored it while this one waited for the lock
+            tables = self.load(version)
+            if tables is not None:
+                return version, tables
+            version, tables = build()
+            if not os.path.exists(self.path(version, SNAPSHOT_TABLES[-1])):
+                self.save(version, tables)
+                self.prune(version)
+        # Serve the mapped files, so this process holds no private copy either, unless another
+        # process stored a newer version and pruned these since the lock was released
+        mapped = self.load(version)
+        return version, tables if mapped is None else mapped
@@ -1,21 +1,28 @@
 import unittest
+import tempfile
 import time
 from datetime import datetime
-from app import AirQualityDashboard
+import pyarrow.compute as pc
+from app import AirQualityDashboard, map_viewport, widen_viewport
+from config import DashboardConfig
+from aqi import aqi, aqi_category
+from data_layer import MAX_MAP_CELL_ZOOM, MAX_SERIES_POINTS
+from snapshot_store import SnapshotStore
 
 class TestAirQualityDashboard(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
-        cls.dashboard = AirQualityDashboard()
+        # Reads the database set by AIR_QUALITY_DB_PATH, air_quality.db in the repository by default
+        cls.dashboard = AirQualityDashboard(db_path=DashboardConfig.from_environment().database_path)
         print("\n🧪 Starting Test Suite for AirQualityDashboard")
 
     def test_001_load_sensor_map_view(self):
-        df = self.dashboard.latest_values_df
-        self.assertFalse(df.empty, "Sensor data should not be empty")
-        self.assertIn("latitude", df.columns)
-        self.assertIn("longitude", df.columns)
-        self.assertIn("pm25", df.columns)
+        table, _ = self.dashboard.get_snapshot().map_cells_in(MAX_MAP_CELL_ZOOM)
+        self.assertGreater(table.num_rows, 0, "Sensor data should not be empty")
+        self.assertIn("latitude", table.column_names)
+        self.assertIn("longitude", table.column_names)
+        self.assertIn("pm25", table.column_names)
         print("✅ TC001 passed: Sensor map data loaded successfully.")
 
     def test_002_auto_refresh_simulation(self):
@@ -27,7 +34,7 @@ class TestAirQualityDashboard(unittest.TestCase):
         print("✅ TC002 passed: Auto-refresh simulation worked correctly.")
 
     def test_003_filter_location_and_parameter(self):
-        df = self.dashboard.df
+        df = self.dashboard.catalog_df
         locations = df["location"].unique()
         parameters = df["parameter"].unique()
         self.assertGreater(len(locations), 0, "No locations found")
@@ -35,28 +42,17 @@ class TestAirQualityDashboard(unittest.TestCase):
         print("✅ TC003 passed: Location and parameter filters are functional.")
 
     def test_004_date_range_filtering(self):
-        df = self.dashboard.daily_stats_df
-        start_date = df["measurement_date"].min()
-        end_date = df["measurement_date"].max()
-        filtered = df[
-            (df["measurement_date"] >= start_date) &
-            (df["measurement_date"] <= end_date)
-        ]
-        self.assertFalse(filtered.empty, "Date filter returned no data")
+        catalog = self.dashboard.catalog_df.iloc[0]
+        filtered = self.dashboard.get_snapshot().daily_stats_between(
+            catalog["location"], catalog["parameter"], catalog["start_date"], catalog["end_date"]
+        )
+        self.assertGreater(filtered.num_rows, 0, "Date filter returned no data")
         print("✅ TC004 passed: Date range filtering works properly.")
 
     def test_005_pm25_value_formatting(self):
-        def categorize_pm25(value):
-            if value <= 12.0:
-                return f"{value:.1f} (Good)"
-            elif value <= 35.4:
-                return f"{value:.1f} (Moderate)"
-            elif value <= 55.4:
-                return f"{value:.1f} (Unhealthy for Sensitive Groups)"
-            else:
-                return f"{value:.1f} (Unhealthy)"
-
-        result = categorize_pm25(25.3)
+        value = 25.3
+        pm25_aqi = aqi("pm25", [value])
+        result = f"{value:.1f} (AQI {pm25_aqi[0]:.0f}, {aqi_category(pm25_aqi)[0]})"
         self.assertIn("Moderate", result)
         print(f"✅ TC005 passed: PM2.5 value '{result}' categorized correctly.")
 
@@ -67,5 +63,54 @@ class TestAirQualityDashboard(unittest.TestCase):
         except Exception as e:
             self.fail(f"App layout setup failed: {e}")
 
+    def test_007_startup_reads_only_the_catalog(self):
+        dashboard = AirQualityDashboard(db_path=self.dashboard.db_path)
+        self.assertIsNone(dashboard.snapshot, "Startup should not load the snapshot")
+        self.assertFalse(dashboard.catalog_df.empty, "Catalog should be loaded at startup")
+        stats = dashboard.startup_stats
+        print(f"✅ TC007 passed: Cold start took {stats['seconds']:.2f}s with {stats['peak_traced_mb']:.1f} MB peak traced memory.")
+
+    def test_008_line_plot_downsampling(self):
+        catalog = self.dashboard.catalog_df.iloc[0]
+        arguments = (catalog["location"], catalog["parameter"], catalog["start_date"], catalog["end_date"])
+        full = self.dashboard.queries.series(*arguments, plot_width=100000)
+        narrow = self.dashboard.queries.series(*arguments, plot_width=100)
+        self.assertLessEqual(full.num_rows, MAX_SERIES_POINTS)
+        self.assertLessEqual(narrow.num_rows, 200)
+        self.assertEqual(pc.max(narrow["average_value"]), pc.max(full["average_value"]), "Peak lost in downsampling")
+        print(f"✅ TC008 passed: Line plot downsampled from {full.num_rows} to {narrow.num_rows} points.")
+
+    def test_009_shared_snapshot_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            built = self.dashboard.queries.snapshot(SnapshotStore(directory))
+            # A second worker maps the files the first one stored
+            mapped = self.dashboard.queries.snapshot(SnapshotStore(directory))
+            self.assertEqual(built.version, mapped.version)
+            self.assertTrue(built.catalog.equals(mapped.catalog), "Mapped catalog differs from the stored one")
+            self.assertEqual(set(built.daily_stats), set(mapped.daily_stats))
+        print(f"✅ TC009 passed: Snapshot of data version {mapped.version} shared through the snapshot store.")
+
+    def test_010_map_viewport_across_the_antimeridian(self):
+        def relayout_data(zoom, west, south, east, north):
+            corners = [[west, north], [east, north], [east, south], [west, south]]
+            return {"mapbox.zoom": zoom, "mapbox._derived": {"coordinates": corners}}
+
+        snapshot = self.dashboard.get_snapshot()
+        # 1400 pixels wide at zoom 3 around Manila, the view runs from -2 to 244 degrees east
+        zoom, bounds = map_viewport(relayout_data(3, -2.0, -56.3, 244.0, 84.3))
+        self.assertGreater(bounds[0], bounds[2], "Viewport should cross the antimeridian")
+        self.assertEqual(widen_viewport(zoom, bounds), [-180.0, -90.0, 180.0, 90.0])
+        cells, level = snapshot.map_cells_in(zoom, widen_viewport(zoom, bounds))
+        self.assertGreater(cells.num_rows, 0, "Wrapped viewport lost its cells")
+        self.assertEqual(cells.num_rows, snapshot.map_cells_in(level)[0].num_rows)
+
+        # Narrower views keep crossing after widening and only hold cells near the antimeridian
+        zoom, bounds = map_viewport(relayout_data(6, 164.6, -8.8, 195.4, 8.8))
+        west, south, east, north = widen_viewport(zoom, bounds)
+        self.assertEqual((west, east), (157.5, -157.5))
+        cells, _ = snapshot.map_cells_in(zoom, (west, south, east, north))
+        self.assertTrue(all(abs(longitude) >= 157.5 for longitude in cells["longitude"].to_pylist()))
+        print("✅ TC010 passed: Map viewports crossing the antimeridian keep their cells.")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,18 @@
+import logging
+
+from app import AirQualityDashboard
+from config import DashboardConfig
+from connection_manager import ConnectionManager
+
+# Imported by every worker process, so each worker builds its own dashboard and opens its own
+# read-only database handle. Serve with `gunicorn -c gunicorn.conf.py wsgi:application`.
+logging.getLogger().setLevel(logging.INFO)
+config = DashboardConfig.from_environment()
+# Registered before the dashboard asks for it, so the dashboard's handle uses these options
+ConnectionManager.get(config.database_path, read_only=True, idle_timeout=config.idle_timeout)
+dashboard = AirQualityDashboard(
+    db_path=config.database_path,
+    refresh_interval=config.refresh_interval,
+    snapshot_dir=config.snapshot_dir
+)
+application = dashboard.app.server
@@ -0,0 +1,63 @@
+from duckdb import DuckDBPyConnection
+
+from table_versions import bump_table_version
+
+# Natural key of a measurement, raw.air_quality holds at most one row per key
+NATURAL_KEY = ["location_id", "sensor_id", '"datetime"', '"parameter"']
+# Physical order of raw.air_quality, so row group zone maps prune filters on location, parameter and time
+CLUSTER_KEY = ["location_id", '"parameter"', '"datetime"']
+
+
+def latest_per_key(relation: str) -> str:
+    """Select the most recently ingested row per natural key from a table or subquery"""
+    return f"""
+        SELECT *
+        FROM {relation}
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY {", ".join(NATURAL_KEY)}
+            ORDER BY ingestion_datetime DESC
+        ) = 1
+        """
+
+
+def create_staging_table(connection: DuckDBPyConnection, staging_table: str) -> None:
+    """Create a temp table shaped like raw.air_quality rows with their location attributes"""
+    connection.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {staging_table} AS
+        SELECT air_quality.*, locations.* EXCLUDE (location_id)
+        FROM raw.air_quality AS air_quality, raw.locations AS locations
+        LIMIT 0
+        """)
+
+
+def merge_air_quality(connection: DuckDBPyConnection, staging_table: str) -> None:
+    """Upsert staged rows into raw.air_quality on the natural key and refresh raw.locations
+
+    Must run inside the caller's transaction so readers never see the rows deleted but not
+    yet re-inserted.
+    """
+    connection.execute(f"""
+        INSERT OR REPLACE INTO raw.locations
+        SELECT
+            location_id,
+            arg_max("location", ingestion_datetime),
+            arg_max(lat, ingestion_datetime),
+            arg_max(lon, ingestion_datetime)
+        FROM {staging_table}
+        GROUP BY location_id
+        """)
+
+    key_matches = " AND ".join(f"target.{column} = staged.{column}" for column in NATURAL_KEY)
+    connection.execute(f"""
+        DELETE FROM raw.air_quality AS target
+        USING {staging_table} AS staged
+        WHERE {key_matches}
+        """)
+    connection.execute(f"""
+        INSERT INTO raw.air_quality BY NAME
+        SELECT * EXCLUDE ("location", lat, lon)
+        FROM ({latest_per_key(staging_table)})
+        ORDER BY {", ".join(CLUSTER_KEY)}
+        """)
+    bump_table_version(connection, "raw.locations")
+    bump_table_version(connection, "raw.air_quality")
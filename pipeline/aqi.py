@@ -0,0 +1,115 @@
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+class Breakpoints(NamedTuple):
+    """AQI breakpoint table of one pollutant, concentrations in `units` truncated to `decimals` places"""
+    units: str
+    decimals: int
+    c_low: np.ndarray
+    c_high: np.ndarray
+    i_low: np.ndarray
+    i_high: np.ndarray
+
+
+def breakpoints(units: str, decimals: int, segments: Sequence[Tuple[float, float, int, int]]) -> Breakpoints:
+    """Build a breakpoint table from (c_low, c_high, i_low, i_high) segments in ascending order"""
+    c_low, c_high, i_low, i_high = np.array(segments, dtype=float).T
+    return Breakpoints(units, decimals, c_low, c_high, i_low, i_high)
+
+
+# US EPA breakpoints, PM2.5 uses the table in force before 2024. Kept in step with the SQL
+# macros in sql/ddl/6_presentation_aqi_macros.sql. O3 follows the 8-hour table up to
+# 0.200 ppm and the 1-hour table's Hazardous segments above 0.404 ppm, in between it is capped at 300.
+AQI_BREAKPOINTS: Dict[str, Breakpoints] = {
+    "pm25": breakpoints("µg/m³", 1, [
+        (0.0, 12.0, 0, 50), (12.1, 35.4, 51, 100), (35.5, 55.4, 101, 150), (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300), (250.5, 350.4, 301, 400), (350.5, 500.4, 401, 500),
+    ]),
+    "pm10": breakpoints("µg/m³", 0, [
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150), (255, 354, 151, 200),
+        (355, 424, 201, 300), (425, 504, 301, 400), (505, 604, 401, 500),
+    ]),
+    "o3": breakpoints("ppm", 3, [
+        (0.000, 0.054, 0, 50), (0.055, 0.070, 51, 100), (0.071, 0.085, 101, 150), (0.086, 0.105, 151, 200),
+        (0.106, 0.200, 201, 300), (0.405, 0.504, 301, 400), (0.505, 0.604, 401, 500),
+    ]),
+    "no2": breakpoints("ppb", 0, [
+        (0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150), (361, 649, 151, 200),
+        (650, 1249, 201, 300), (1250, 1649, 301, 400), (1650, 2049, 401, 500),
+    ]),
+    "so2": breakpoints("ppb", 0, [
+        (0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150), (186, 304, 151, 200),
+        (305, 604, 201, 300), (605, 804, 301, 400), (805, 1004, 401, 500),
+    ]),
+    "co": breakpoints("ppm", 1, [
+        (0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150), (12.5, 15.4, 151, 200),
+        (15.5, 30.4, 201, 300), (30.5, 40.4, 301, 400), (40.5, 50.4, 401, 500),
+    ]),
+}
+
+# Upper bounds of the AQI categories, an AQI equal to a bound belongs to the lower category
+AQI_CATEGORY_BOUNDS = np.array([50, 100, 150, 200, 300])
+# Object dtype so indexing copies references rather than fixed-width strings
+AQI_CATEGORIES = np.array([
+    "Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"
+], dtype=object)
+AQI_CATEGORY_COLORS = {
+    "Good": "#00E400",
+    "Moderate": "#FFFF00",
+    "Unhealthy for Sensitive Groups": "#FF7E00",
+    "Unhealthy": "#FF0000",
+    "Very Unhealthy": "#8F3F97",
+    "Hazardous": "#7E0023",
+}
+
+# Molar masses in g/mol and the molar volume in L/mol at 25 °C and 1 atm, to convert gases reported by mass
+MOLAR_MASSES = {"o3": 48.00, "no2": 46.01, "so2": 64.07, "co": 28.01}
+MOLAR_VOLUME = 24.45
+MASS_UNITS = {"µg/m³": 1.0, "ug/m3": 1.0, "mg/m³": 1000.0, "mg/m3": 1000.0}
+MIXING_RATIO_UNITS = {"ppb": 1.0, "ppm": 1000.0}
+
+
+def to_breakpoint_units(parameter: str, values: ArrayLike, units: Optional[str] = None) -> np.ndarray:
+    """Convert concentrations of a pollutant to the units of its breakpoint table"""
+    values = np.asarray(values, dtype=float)
+    target = AQI_BREAKPOINTS[parameter].units
+    if units is None or units == target or parameter not in MOLAR_MASSES:
+        return values
+    if units in MASS_UNITS:
+        ppb = values * MASS_UNITS[units] * MOLAR_VOLUME / MOLAR_MASSES[parameter]
+    elif units in MIXING_RATIO_UNITS:
+        ppb = values * MIXING_RATIO_UNITS[units]
+    else:
+        raise ValueError(f"Cannot convert {parameter} from {units} to {target}")
+    return ppb / MIXING_RATIO_UNITS[target]
+
+
+def aqi(parameter: str, values: ArrayLike, units: Optional[str] = None) -> np.ndarray:
+    """AQI of an array of concentrations, NaN where a value is missing or the pollutant has no table"""
+    values = np.asarray(values, dtype=float)
+    table = AQI_BREAKPOINTS.get(parameter)
+    if table is None:
+        return np.full(values.shape, np.nan)
+
+    scale = 10.0 ** table.decimals
+    # The small offset keeps values like 0.29 from truncating to 0.28 through binary rounding
+    truncated = np.floor(np.maximum(to_breakpoint_units(parameter, values, units), 0) * scale + 1e-9) / scale
+    segment = np.searchsorted(table.c_low, truncated, side="right") - 1
+    c_low, c_high = table.c_low[segment], table.c_high[segment]
+    i_low, i_high = table.i_low[segment], table.i_high[segment]
+    index = np.minimum((i_high - i_low) / (c_high - c_low) * (truncated - c_low) + i_low, i_high)
+    return np.where(np.isnan(values), np.nan, np.floor(index + 0.5))
+
+
+def aqi_category(values: ArrayLike) -> np.ndarray:
+    """Category names of an array of AQI values, None where the AQI is NaN"""
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    categories = AQI_CATEGORIES[np.searchsorted(AQI_CATEGORY_BOUNDS, np.where(missing, 0, values), side="left")]
+    if missing.any():
+        categories[missing] = None
+    return categories
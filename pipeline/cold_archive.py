@@ -0,0 +1,106 @@
+import logging
+import os
+from datetime import datetime
+
+from duckdb import DuckDBPyConnection
+
+from air_quality_merge import CLUSTER_KEY, NATURAL_KEY, latest_per_key
+from ingestion_manifest import PartitionKey
+from table_versions import bump_table_version
+
+HIVE_TYPES = "{'location_id': 'BIGINT', 'year': 'SMALLINT', 'month': 'UTINYINT'}"
+
+
+class ColdArchive:
+    def __init__(self, archive_path: str):
+        """Hive-partitioned Parquet store for raw rows moved out of the database"""
+        self.archive_path = os.path.abspath(archive_path)
+
+    def partition_path(self, key: PartitionKey) -> str:
+        """Build the Parquet file path of a location/year/month partition"""
+        location_id, year, month = key
+        return f"{self.archive_path}/location_id={location_id}/year={year}/month={month:02d}/data.parquet"
+
+    def files_glob(self) -> str:
+        """Glob matching every archived Parquet file"""
+        return f"{self.archive_path}/location_id=*/year=*/month=*/*.parquet"
+
+    def write_partition(self, connection: DuckDBPyConnection, key: PartitionKey, cutoff: datetime) -> None:
+        """Merge the cold raw rows of a partition into its Parquet file
+
+        Partitions archived before keep their rows, re-ingested rows replace them on the
+        natural key. The file is replaced atomically once the merged copy is written.
+        """
+        path = self.partition_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cold_rows = """
+            SELECT *
+            FROM raw.air_quality
+            WHERE location_id = $1 AND "year" = $2 AND "month" = $3 AND "datetime" < $4
+            """
+        if os.path.exists(path):
+            cold_rows += f"UNION ALL BY NAME SELECT * FROM read_parquet('{path}')"
+        connection.execute(f"""
+            COPY (
+                {latest_per_key(f"({cold_rows})")}
+                ORDER BY {", ".join(CLUSTER_KEY)}
+            ) TO '{path}.tmp' (FORMAT parquet, COMPRESSION zstd)
+            """, [*key, cutoff])
+        os.replace(f"{path}.tmp", path)
+
+    def union_view_query(self, cutoff: datetime) -> str:
+        """Define raw.air_quality_all over the hot table and the archived partitions
+
+        Rows older than the cutoff that were ingested again after archiving are read from the
+        hot table only, until the next archive run merges them into the Parquet files.
+        """
+        return f"""
+            CREATE OR REPLACE VIEW raw.air_quality_all AS
+            SELECT * FROM raw.air_quality
+            UNION ALL BY NAME
+            SELECT cold.*
+            FROM read_parquet('{self.files_glob()}', hive_partitioning = true, hive_types = {HIVE_TYPES}) AS cold
+            ANTI JOIN (
+                SELECT {", ".join(NATURAL_KEY)}
+                FROM raw.air_quality
+                WHERE "datetime" < TIMESTAMP '{cutoff}'
+            ) AS hot USING ({", ".join(NATURAL_KEY)})
+            """
+
+    def archive(self, connection: DuckDBPyConnection, cutoff: datetime) -> None:
+        """Move raw rows measured before the cutoff into Parquet and compact the database"""
+        keys = connection.execute(
+            """
+            SELECT DISTINCT location_id, "year", "month"
+            FROM raw.air_quality
+            WHERE "datetime" < ?
+            ORDER BY ALL
+            """,
+            [cutoff]
+        ).fetchall()
+        for key in keys:
+            self.write_partition(connection, key, cutoff)
+        logging.info(f"Archived {len(keys)} partitions measured before {cutoff} to {self.archive_path}")
+
+        if not keys and not os.path.isdir(self.archive_path):
+            return
+
+        connection.begin()
+        try:
+            before = connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+            # Rewriting the hot rows instead of deleting the cold ones leaves no half-empty row groups
+            connection.execute(f"""
+                CREATE OR REPLACE TABLE raw.air_quality AS
+                SELECT * FROM raw.air_quality
+                WHERE "datetime" >= ?
+                ORDER BY {", ".join(CLUSTER_KEY)}
+                """, [cutoff])
+            connection.execute(self.union_view_query(cutoff))
+            bump_table_version(connection, "raw.air_quality")
+            after = connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        connection.execute("CHECKPOINT")
+        logging.info(f"Removed {before - after} archived rows from raw.air_quality, {after} rows remain")
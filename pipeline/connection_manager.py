@@ -0,0 +1,206 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import duckdb as ddb
+from duckdb import DuckDBPyConnection
+
+# DuckDB settings read from the environment, applied once whenever a database handle opens
+SETTING_ENVIRONMENT_VARIABLES = {
+    "threads": "DUCKDB_THREADS",
+    "memory_limit": "DUCKDB_MEMORY_LIMIT",
+    "s3_access_key_id": "S3_ACCESS_KEY_ID",
+    "s3_secret_access_key": "S3_SECRET_ACCESS_KEY",
+    "s3_region": "S3_REGION",
+}
+
+
+def settings_from_environment() -> Dict[str, str]:
+    """Collect the DuckDB settings configured through environment variables"""
+    return {
+        setting: os.environ[variable]
+        for setting, variable in SETTING_ENVIRONMENT_VARIABLES.items()
+        if os.environ.get(variable)
+    }
+
+
+class ConnectionManager:
+    instances: Dict[Tuple[str, bool], "ConnectionManager"] = {}
+    instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        database_path: str,
+        read_only: bool = False,
+        settings: Optional[Dict[str, str]] = None,
+        pool_size: int = 16,
+        idle_timeout: Optional[float] = 2.0,
+        max_age: Optional[float] = 60.0,
+        lock_timeout: float = 30.0
+    ):
+        """Process-wide DuckDB database handle lending out a bounded pool of cursors
+
+        DuckDB locks the database file for the lifetime of a handle, so a handle nobody has
+        used for `idle_timeout` seconds is closed to let other processes write. A handle older
+        than `max_age` seconds is reopened at the next acquire with no cursor in use, so
+        read-only readers pick up data committed by other processes. Opening retries for up
+        to `lock_timeout` seconds while another process holds a conflicting lock.
+        """
+        self.database_path = database_path
+        self.read_only = read_only
+        self.settings = settings_from_environment() if settings is None else settings
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.lock_timeout = lock_timeout
+        self.condition = threading.Condition()
+        self.connection: Optional[DuckDBPyConnection] = None
+        self.idle: List[DuckDBPyConnection] = []
+        self.in_use = 0
+        self.opened_at = 0.0
+        self.idle_timer: Optional[threading.Timer] = None
+        self.opens = 0
+        self.open_seconds = 0.0
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.peak_in_use = 0
+
+    @classmethod
+    def get(cls, database_path: str, read_only: bool = False, **options) -> "ConnectionManager":
+        """Return the shared manager of a database file, creating it on first use"""
+        key = (os.path.abspath(database_path), read_only)
+        with cls.instances_lock:
+            if key not in cls.instances:
+                cls.instances[key] = cls(database_path, read_only, **options)
+            return cls.instances[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every shared database handle of the process"""
+        with cls.instances_lock:
+            managers = list(cls.instances.values())
+        for manager in managers:
+            manager.close()
+
+    def open(self) -> None:
+        """Open the database handle and apply the session settings"""
+        started = time.perf_counter()
+        delay = 0.05
+        while True:
+            try:
+                connection = ddb.connect(self.database_path, read_only=self.read_only)
+                break
+            except ddb.IOException as e:
+                if "lock" not in str(e) or time.perf_counter() - started + delay > self.lock_timeout:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        for setting, value in self.settings.items():
+            connection.execute(f"SET {setting} = '{value}'")
+        self.connection = connection
+        self.opened_at = time.monotonic()
+        self.opens += 1
+        self.open_seconds += time.perf_counter() - started
+        logging.info(f"Opened database at {self.database_path} (read_only={self.read_only})")
+
+    def close_handle(self) -> None:
+        """Close the pooled cursors and the database handle, the caller holds the condition"""
+        for cursor in self.idle:
+            cursor.close()
+        self.idle = []
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def acquire(self, timeout: Optional[float] = None) -> DuckDBPyConnection:
+        """Borrow a cursor, waiting while all `pool_size` cursors are in use"""
+        with self.condition:
+            self.acquisitions += 1
+            if self.in_use >= self.pool_size:
+                self.waits += 1
+                started = time.perf_counter()
+                available = self.condition.wait_for(lambda: self.in_use < self.pool_size, timeout)
+                self.wait_seconds += time.perf_counter() - started
+                if not available:
+                    raise TimeoutError(f"No cursor for {self.database_path} became available in {timeout}s")
+
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+                self.idle_timer = None
+            if (
+                self.connection is not None
+                and self.in_use == 0
+                and self.max_age is not None
+                and time.monotonic() - self.opened_at > self.max_age
+            ):
+                self.close_handle()
+            if self.connection is None:
+                self.open()
+
+            cursor = self.idle.pop() if self.idle else self.connection.cursor()
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            return cursor
+
+    def release(self, cursor: DuckDBPyConnection) -> None:
+        """Return a borrowed cursor to the pool"""
+        with self.condition:
+            self.in_use -= 1
+            if self.connection is None:
+                # The handle was closed while the cursor was out
+                cursor.close()
+            else:
+                self.idle.append(cursor)
+            self.condition.notify()
+
+            if self.in_use == 0 and self.connection is not None and self.idle_timeout is not None:
+                self.idle_timer = threading.Timer(self.idle_timeout, self.close_if_idle)
+                self.idle_timer.daemon = True
+                self.idle_timer.start()
+
+    def close_if_idle(self) -> None:
+        """Close the handle unless a cursor was borrowed since the idle timer started"""
+        with self.condition:
+            if self.idle_timer is threading.current_thread() and self.in_use == 0:
+                self.idle_timer = None
+                self.close_handle()
+
+    @contextmanager
+    def cursor(self, timeout: Optional[float] = None) -> Iterator[DuckDBPyConnection]:
+        """Borrow a cursor for the duration of a with block"""
+        cursor = self.acquire(timeout)
+        try:
+            yield cursor
+        finally:
+            self.release(cursor)
+
+    def stats(self) -> Dict[str, object]:
+        """Snapshot of the pool counters"""
+        with self.condition:
+            return {
+                "open": self.connection is not None,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "peak_in_use": self.peak_in_use,
+                "acquisitions": self.acquisitions,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 4),
+                "opens": self.opens,
+                "open_seconds": round(self.open_seconds, 4),
+            }
+
+    def close(self) -> None:
+        """Close the database handle, cursors still borrowed are closed when released"""
+        with self.condition:
+            if self.idle_timer is not None:
+                self.idle_timer.cancel()
+                self.idle_timer = None
+            self.close_handle()
+
+
+atexit.register(ConnectionManager.close_all)
@@ -1,10 +1,16 @@
+from datetime import date
 from typing import List
 import os
 import argparse
 import logging
 
 from duckdb import DuckDBPyConnection
-import duckdb as ddb
+
+from air_quality_merge import CLUSTER_KEY, latest_per_key
+from cold_archive import ColdArchive
+from connection_manager import ConnectionManager
+from landing_zone import LandingZone
+from table_versions import bump_table_version
 
 class DatabaseManager:
     def __init__(self, database_path: str, ddl_query_parent_dir: str = None):
@@ -14,21 +20,16 @@ class DatabaseManager:
         logging.getLogger().setLevel(logging.INFO)
 
     def connect(self) -> DuckDBPyConnection:
-        """Connect to the database"""
+        """Borrow a cursor on the process-wide database handle"""
         logging.info(f"Connecting to database at {self.database_path}")
-        self.connection = ddb.connect(self.database_path)
-        self.connection.sql("""
-            SET s3_access_key_id='';
-            SET s3_secret_access_key='';
-            SET s3_region='';
-            """)
+        self.connection = ConnectionManager.get(self.database_path).acquire()
         return self.connection
 
     def close(self) -> None:
-        """Close the database connection"""
+        """Return the cursor to the connection pool"""
         if self.connection:
             logging.info("Closing database connection")
-            self.connection.close()
+            ConnectionManager.get(self.database_path).release(self.connection)
             self.connection = None
 
     def collect_query_paths(self) -> List[str]:
@@ -46,7 +47,7 @@ class DatabaseManager:
     @staticmethod
     def read_query(path: str) -> str:
         """Read SQL query from file"""
-        with open(path, "r") as f:
+        with open(path, "r", encoding="utf-8") as f:
             query = f.read()
         return query
 
@@ -67,9 +68,67 @@ class DatabaseManager:
         
         self.close()
 
+    def deduplicate(self) -> None:
+        """Collapse duplicates left by append-only ingestion so raw.air_quality is unique on its natural key"""
+        self.connect()
+        try:
+            before = self.connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+            self.connection.execute(f"""
+                CREATE OR REPLACE TABLE raw.air_quality AS
+                {latest_per_key('raw.air_quality')}
+                ORDER BY {", ".join(CLUSTER_KEY)}
+                """)
+            bump_table_version(self.connection, "raw.air_quality")
+            after = self.connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+            logging.info(f"Removed {before - after} duplicate rows from raw.air_quality")
+        finally:
+            self.close()
+
+    def cluster(self) -> None:
+        """Rewrite raw.air_quality ordered by its cluster key so zone maps can skip row groups"""
+        self.connect()
+        try:
+            self.connection.begin()
+            self.connection.execute(f"""
+                CREATE OR REPLACE TABLE raw.air_quality AS
+                SELECT * FROM raw.air_quality
+                ORDER BY {", ".join(CLUSTER_KEY)}
+                """)
+            bump_table_version(self.connection, "raw.air_quality")
+            self.connection.commit()
+            # Release the row groups of the unsorted copy
+            self.connection.execute("CHECKPOINT")
+            row_groups = self.connection.execute(
+                "SELECT count(DISTINCT row_group_id) FROM pragma_storage_info('raw.air_quality')"
+            ).fetchone()[0]
+            columns = ", ".join(column.strip('"') for column in CLUSTER_KEY)
+            logging.info(f"Clustered raw.air_quality by {columns} into {row_groups} row groups")
+        finally:
+            self.close()
+
+    def archive(self, months: int, archive_path: str) -> None:
+        """Move raw rows older than the last `months` whole months into the Parquet archive"""
+        month_start = date.today().replace(day=1)
+        month_index = month_start.year * 12 + month_start.month - 1 - months
+        cutoff = date(month_index // 12, month_index % 12 + 1, 1)
+        self.connect()
+        try:
+            ColdArchive(archive_path).archive(self.connection, cutoff)
+        finally:
+            self.close()
+
+    def rebuild_from_landing(self, landing_path: str) -> None:
+        """Reload raw.air_quality from the Parquet landing zone instead of the source CSV"""
+        self.connect()
+        try:
+            LandingZone(landing_path).rebuild(self.connection)
+        finally:
+            self.close()
+
     def destroy(self) -> None:
         """Destroy the database"""
         self.close()
+        ConnectionManager.get(self.database_path).close()
         if os.path.exists(self.database_path):
             os.remove(self.database_path)
             logging.info(f"Destroyed database at {self.database_path}")
@@ -81,9 +140,14 @@ def main():
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--create", action="store_true", help="Create the database")
     group.add_argument("--destroy", action="store_true", help="Destroy the database")
+    group.add_argument("--deduplicate", action="store_true", help="Remove duplicate raw rows left by append-only ingestion")
+    group.add_argument("--cluster", action="store_true", help="Rewrite raw data ordered by location, parameter and datetime")
+    group.add_argument("--archive-older-than", type=int, metavar="MONTHS", help="Move raw data older than MONTHS whole months to Parquet")
+    group.add_argument("--rebuild-from-landing", type=str, metavar="LANDING_PATH", help="Reload raw data from the Parquet landing zone")
 
     parser.add_argument("--database-path", type=str, help="Path to the database")
     parser.add_argument("--ddl-query-parent-dir", type=str, help="Path to the parent directory of the ddl queries")
+    parser.add_argument("--archive-path", type=str, default="archive", help="Directory of the Parquet archive")
 
     args = parser.parse_args()
     
@@ -96,6 +160,14 @@ def main():
         db_manager.setup()
     elif args.destroy:
         db_manager.destroy()
+    elif args.deduplicate:
+        db_manager.deduplicate()
+    elif args.cluster:
+        db_manager.cluster()
+    elif args.archive_older_than is not None:
+        db_manager.archive(args.archive_older_than, args.archive_path)
+    elif args.rebuild_from_landing:
+        db_manager.rebuild_from_landing(args.rebuild_from_landing)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,37 @@
 """
-Example usage: python extraction.py --locations_file_path ../location.json --start_date 2024-01 --end_date 2025-01 --database_path ../air_quality.db --extract_query_template_path ../sql/dml/raw/0_raw_air_quality_insert.sql --source_base_path s3://openaq-data-archive/records/csv.gz
+Example usage: python extraction.py --locations_file_path ../location.json --start_date 2024-01 --end_date 2025-01 --database_path ../air_quality.db --extract_query_template_path ../sql/dml/raw/0_raw_air_quality_insert.sql --source_base_path s3://openaq-data-archive/records/csv.gz --workers 8 --batch_size 12
 """
 import argparse
 import json
 import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from typing import List
+from typing import List, NamedTuple
 
 from duckdb import IOException, DuckDBPyConnection
 from jinja2 import Template
 
+from air_quality_merge import create_staging_table, merge_air_quality
 from database_manager import DatabaseManager
+from ingestion_manifest import IngestionManifest, PartitionKey
+from landing_zone import LandingZone
+from partition_discovery import PartitionDiscovery
+from source_cache import SourceCache
+
+PARTITION_PATTERN = re.compile(r"locationid=(?P<location_id>[^/]+)/year=(?P<year>\d+)/month=(?P<month>\d+)")
+
+
+class BatchResult(NamedTuple):
+    label: str
+    partitions: int
+    unchanged: int
+    rows: int
+    seconds: float
+
 
 class DataExtractor:
     def __init__(
@@ -21,7 +41,15 @@ class DataExtractor:
         end_date: str,
         database_path: str,
         extract_query_template_path: str,
-        source_base_path: str
+        source_base_path: str,
+        workers: int = 1,
+        batch_size: int = 1,
+        batch_by: str = "location",
+        incremental: bool = False,
+        listing_max_age: int = 60,
+        cache_dir: str = None,
+        cache_max_mb: int = 1024,
+        landing_path: str = None
     ):
         self.locations_file_path = locations_file_path
         self.start_date = start_date
@@ -29,9 +57,22 @@ class DataExtractor:
         self.database_path = database_path
         self.extract_query_template_path = extract_query_template_path
         self.source_base_path = source_base_path
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_by = batch_by
+        self.incremental = incremental
+        self.manifest = IngestionManifest()
+        self.discovery = PartitionDiscovery(source_base_path, listing_max_age)
+        self.partitions = {}
+        self.cache = SourceCache(cache_dir, cache_max_mb * 1024 * 1024) if cache_dir else None
+        self.landing_zone = LandingZone(landing_path) if landing_path else None
         self.db_manager = DatabaseManager(database_path)
         self.data_file_path_template = "locationid={{location_id}}/year={{year}}/month={{month}}/*"
-        
+        self.staging_table = "raw_air_quality_staging"
+        self.append_lock = threading.Lock()
+        self.worker_state = threading.local()
+        self.worker_cursors = []
+
     def read_location_ids(self) -> List[str]:
         """Read location IDs from JSON file"""
         with open(self.locations_file_path, "r") as f:
@@ -57,31 +98,173 @@ class DataExtractor:
                 index_date += relativedelta(months=1)
         return data_file_paths
 
-    def compile_data_file_query(self, data_file_path: str, extract_query_template: str) -> str:
+    @staticmethod
+    def partition_key(data_file_path: str) -> PartitionKey:
+        """Parse (location_id, year, month) from a partition path"""
+        match = PARTITION_PATTERN.search(data_file_path)
+        return int(match.group("location_id")), int(match.group("year")), int(match.group("month"))
+
+    def compile_batches(self, data_file_paths: List[str]) -> List[List[str]]:
+        """Group partition paths by location or by month into batches of at most batch_size"""
+        groups = {}
+        for data_file_path in data_file_paths:
+            location_id, year, month = self.partition_key(data_file_path)
+            group_key = location_id if self.batch_by == "location" else (year, month)
+            groups.setdefault(group_key, []).append(data_file_path)
+
+        batches = []
+        for group in groups.values():
+            for index in range(0, len(group), self.batch_size):
+                batches.append(group[index:index + self.batch_size])
+        return batches
+
+    def compile_data_file_query(
+        self,
+        data_files: List[str],
+        extract_query_template: str,
+        target_table: str
+    ) -> str:
         """Compile query for data file extraction"""
         return Template(extract_query_template).render(
-            data_file_path=f"{self.source_base_path}/{data_file_path}"
+            data_files=data_files,
+            target_table=target_table
         )
 
+    def is_open_partition(self, key: PartitionKey) -> bool:
+        """Check whether a partition is the current month, which keeps receiving files"""
+        today = datetime.now()
+        return key[1:] == (today.year, today.month)
+
+    def worker_cursor(self) -> DuckDBPyConnection:
+        """Get the calling worker's cursor, creating it and its staging table on first use"""
+        cursor = getattr(self.worker_state, "cursor", None)
+        if cursor is None:
+            cursor = self.db_manager.connection.cursor()
+            create_staging_table(cursor, self.staging_table)
+            self.worker_state.cursor = cursor
+            with self.append_lock:
+                self.worker_cursors.append(cursor)
+        return cursor
+
+    def extract_batch(self, batch: List[str], extract_query_template: str) -> BatchResult:
+        """Fetch and parse a batch of partitions into the worker's staging table, then upsert it into raw.air_quality"""
+        started = time.perf_counter()
+        label = batch[0] if len(batch) == 1 else f"{batch[0]} (+{len(batch) - 1} partitions)"
+        cursor = self.worker_cursor()
+
+        keys = [self.partition_key(data_file_path) for data_file_path in batch]
+        source_files = {key: self.partitions[key] for key in keys}
+        if self.incremental:
+            source_files = {
+                key: files for key, files in source_files.items()
+                if self.is_open_partition(key) or not self.manifest.is_unchanged(key, files)
+            }
+        unchanged = len(batch) - len(source_files)
+        if not source_files:
+            return BatchResult(label, 0, unchanged, 0, time.perf_counter() - started)
+
+        data_files = []
+        try:
+            for files in source_files.values():
+                for filename, size, last_modified in files:
+                    data_files.append(
+                        self.cache.fetch(cursor, filename, size, last_modified) if self.cache else filename
+                    )
+            query = self.compile_data_file_query(data_files, extract_query_template, self.staging_table)
+            cursor.execute(f"DELETE FROM {self.staging_table}")
+            cursor.execute(query)
+        except IOException as e:
+            logging.warning(f"Could not extract data from {label}: {e}")
+            return BatchResult(label, 0, unchanged, 0, time.perf_counter() - started)
+        finally:
+            if self.cache:
+                self.cache.release(data_files)
+
+        row_counts = dict.fromkeys(source_files, 0)
+        row_counts.update({
+            (location_id, year, int(month)): row_count
+            for location_id, year, month, row_count in cursor.execute(f"""
+                SELECT location_id, "year", "month", count(*)
+                FROM {self.staging_table}
+                GROUP BY ALL
+                """).fetchall()
+        })
+
+        if self.landing_zone:
+            self.landing_zone.write(cursor, self.staging_table, source_files)
+
+        # Only the write into the shared tables is serialized, fetching and parsing run concurrently
+        with self.append_lock:
+            cursor.begin()
+            try:
+                merge_air_quality(cursor, self.staging_table)
+                for key, files in source_files.items():
+                    self.manifest.record(cursor, key, files, row_counts.get(key, 0))
+                cursor.commit()
+            except Exception:
+                cursor.rollback()
+                raise
+
+        row_count = sum(row_counts.values())
+        elapsed = time.perf_counter() - started
+        logging.info(f"Extracted {row_count} rows from {label} in {elapsed:.2f}s")
+        return BatchResult(label, len(source_files), unchanged, row_count, elapsed)
+
     def extract_data(self):
         """Main extraction process"""
         location_ids = self.read_location_ids()
-        data_file_paths = self.compile_data_file_paths(location_ids)
         extract_query_template = self.db_manager.read_query(self.extract_query_template_path)
-        
+        started = time.perf_counter()
+
         connection = self.db_manager.connect()
+        self.manifest.load(connection)
+        self.partitions = self.discovery.discover(connection, location_ids)
 
-        for data_file_path in data_file_paths:
-            logging.info(f"Extracting data from {data_file_path}")
-            query = self.compile_data_file_query(data_file_path, extract_query_template)
+        # Plan work only from partitions that exist in the source
+        requested_paths = self.compile_data_file_paths(location_ids)
+        data_file_paths = [
+            data_file_path for data_file_path in requested_paths
+            if self.partition_key(data_file_path) in self.partitions
+        ]
+        missing = len(requested_paths) - len(data_file_paths)
+        batches = self.compile_batches(data_file_paths)
+        logging.info(
+            f"Extracting {len(data_file_paths)} partitions ({missing} missing) in {len(batches)} batches "
+            f"with {self.workers} worker(s)"
+        )
 
-            try:
-                self.db_manager.execute_query(query)
-                logging.info(f"Extracted data from {data_file_path}!")
-            except IOException as e:
-                logging.warning(f"Could not find data from {data_file_path}: {e}")
-        
-        self.db_manager.close()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(
+                    lambda batch: self.extract_batch(batch, extract_query_template),
+                    batches
+                ))
+        finally:
+            for cursor in self.worker_cursors:
+                cursor.close()
+            self.worker_cursors = []
+            self.db_manager.close()
+
+        self.report(results, missing, time.perf_counter() - started)
+        if self.cache:
+            self.cache.report()
+
+    @staticmethod
+    def report(results: List[BatchResult], missing: int, elapsed: float) -> None:
+        """Log per-batch timings and overall throughput"""
+        extracted = [result for result in results if result.partitions > 0]
+        total_rows = sum(result.rows for result in extracted)
+
+        for result in sorted(extracted, key=lambda result: result.seconds, reverse=True):
+            logging.info(f"{result.seconds:8.2f}s {result.rows:>10} rows  {result.label}")
+
+        rows_per_second = total_rows / elapsed if elapsed > 0 else 0.0
+        logging.info(
+            f"Extracted {total_rows} rows from {sum(result.partitions for result in results)} partitions "
+            f"({missing} missing, "
+            f"{sum(result.unchanged for result in results)} unchanged) in {elapsed:.2f}s, "
+            f"{rows_per_second:.0f} rows/sec"
+        )
 
 def main():
     logging.getLogger().setLevel(logging.INFO)
@@ -122,6 +305,54 @@ def main():
         required=True,
         help="Base path for the remote data files",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of batches to fetch and parse concurrently",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="Maximum number of partitions read by a single INSERT statement",
+    )
+    parser.add_argument(
+        "--batch_by",
+        type=str,
+        choices=["location", "month"],
+        default="location",
+        help="Group batched partitions by location or by month",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch partitions that are new or changed since the last run, plus the current month",
+    )
+    parser.add_argument(
+        "--listing_max_age",
+        type=int,
+        default=60,
+        help="Minutes a cached source partition listing is reused before listing again",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Directory of the local source file cache, disabled when omitted",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=int,
+        default=1024,
+        help="Size cap of the local source file cache in megabytes",
+    )
+    parser.add_argument(
+        "--landing_path",
+        type=str,
+        default=None,
+        help="Base path of the Parquet landing zone, disabled when omitted",
+    )
 
     args = parser.parse_args()
     
@@ -131,7 +362,15 @@ def main():
         end_date=args.end_date,
         database_path=args.database_path,
         extract_query_template_path=args.extract_query_template_path,
-        source_base_path=args.source_base_path
+        source_base_path=args.source_base_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        batch_by=args.batch_by,
+        incremental=args.incremental,
+        listing_max_age=args.listing_max_age,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        landing_path=args.landing_path
     )
     extractor.extract_data()
 
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Tuple
+
+from duckdb import DuckDBPyConnection
+
+PartitionKey = Tuple[int, int, int]
+SourceFile = Tuple[str, int, datetime]
+
+
+class IngestionManifest:
+    def __init__(self):
+        """Track which source partitions have been loaded into raw.air_quality"""
+        self.entries: Dict[PartitionKey, FrozenSet[SourceFile]] = {}
+
+    def load(self, connection: DuckDBPyConnection) -> None:
+        """Load the file fingerprints of every ingested partition"""
+        rows = connection.execute("""
+            SELECT location_id, "year", "month", files, file_sizes, file_mtimes
+            FROM raw.ingestion_manifest
+            """).fetchall()
+        self.entries = {
+            (location_id, year, month): frozenset(zip(files, file_sizes, file_mtimes))
+            for location_id, year, month, files, file_sizes, file_mtimes in rows
+        }
+
+    def is_unchanged(self, key: PartitionKey, source_files: List[SourceFile]) -> bool:
+        """Check whether a partition was already ingested from exactly these files"""
+        return self.entries.get(key) == frozenset(source_files)
+
+    def record(
+        self,
+        connection: DuckDBPyConnection,
+        key: PartitionKey,
+        source_files: List[SourceFile],
+        row_count: int
+    ) -> None:
+        """Record a freshly ingested partition"""
+        files, file_sizes, file_mtimes = (list(column) for column in zip(*sorted(source_files)))
+        connection.execute(
+            "INSERT OR REPLACE INTO raw.ingestion_manifest VALUES (?, ?, ?, ?, ?, ?, ?, current_timestamp)",
+            [*key, files, file_sizes, file_mtimes, row_count]
+        )
+        self.entries[key] = frozenset(source_files)
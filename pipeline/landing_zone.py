@@ -0,0 +1,58 @@
+import logging
+import os
+from typing import Iterable
+
+from duckdb import DuckDBPyConnection
+
+from air_quality_merge import merge_air_quality
+from ingestion_manifest import PartitionKey
+
+
+class LandingZone:
+    def __init__(self, landing_path: str):
+        """Hive-partitioned Parquet copy of every fetched partition, written once per fetch"""
+        self.landing_path = landing_path.rstrip("/")
+
+    def partition_path(self, key: PartitionKey) -> str:
+        """Build the Parquet file path of a location/year/month partition"""
+        location_id, year, month = key
+        return f"{self.landing_path}/location_id={location_id}/year={year}/month={month:02d}/data.parquet"
+
+    def files_glob(self) -> str:
+        """Glob matching every landed Parquet file"""
+        return f"{self.landing_path}/location_id=*/year=*/month=*/*.parquet"
+
+    def write(self, connection: DuckDBPyConnection, staging_table: str, keys: Iterable[PartitionKey]) -> None:
+        """Convert staged partitions into zstd Parquet files with rows sorted by datetime"""
+        for key in keys:
+            path = self.partition_path(key)
+            if "://" not in path:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection.execute(f"""
+                COPY (
+                    SELECT *
+                    FROM {staging_table}
+                    WHERE location_id = ? AND "year" = ? AND CAST("month" AS BIGINT) = ?
+                    ORDER BY "datetime"
+                ) TO '{path}' (FORMAT parquet, COMPRESSION zstd)
+                """, list(key))
+
+    def rebuild(self, connection: DuckDBPyConnection) -> None:
+        """Replace raw.air_quality with a columnar scan of the landed Parquet files"""
+        connection.execute(f"""
+            CREATE OR REPLACE TEMP VIEW landing_staging AS
+            SELECT *
+            FROM read_parquet('{self.files_glob()}', hive_partitioning = true)
+            """)
+        connection.begin()
+        try:
+            connection.execute("DELETE FROM raw.air_quality")
+            merge_air_quality(connection, "landing_staging")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.execute("DROP VIEW IF EXISTS landing_staging")
+        row_count = connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+        logging.info(f"Rebuilt raw.air_quality with {row_count} rows from {self.landing_path}")
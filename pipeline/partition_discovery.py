@@ -0,0 +1,92 @@
+import logging
+from typing import Dict, List
+
+from duckdb import DuckDBPyConnection
+
+from ingestion_manifest import PartitionKey, SourceFile
+
+
+class PartitionDiscovery:
+    def __init__(self, source_base_path: str, max_age_minutes: int = 60):
+        """List the source partitions that exist instead of probing every location/month"""
+        self.source_base_path = source_base_path
+        self.max_age_minutes = max_age_minutes
+
+    def stale_location_ids(self, connection: DuckDBPyConnection, location_ids: List[str]) -> List[str]:
+        """Find locations without a cached listing younger than max_age_minutes"""
+        fresh = {
+            str(row[0]) for row in connection.execute("""
+                SELECT location_id
+                FROM raw.source_listings
+                WHERE listed_at > current_localtimestamp() - to_minutes(CAST(? AS BIGINT))
+                """, [self.max_age_minutes]).fetchall()
+        }
+        return [location_id for location_id in location_ids if location_id not in fresh]
+
+    def refresh(self, connection: DuckDBPyConnection, location_ids: List[str]) -> None:
+        """List the partition tree of the given locations with a single metadata-only read_blob call"""
+        patterns = [
+            f"{self.source_base_path}/locationid={location_id}/year=*/month=*/*"
+            for location_id in location_ids
+        ]
+        numeric_ids = [int(location_id) for location_id in location_ids]
+
+        connection.begin()
+        try:
+            connection.execute(
+                "DELETE FROM raw.source_files WHERE location_id IN (SELECT unnest(?))",
+                [numeric_ids]
+            )
+            connection.execute("""
+                INSERT INTO raw.source_files
+                SELECT
+                    CAST(partition_key.location_id AS BIGINT),
+                    CAST(partition_key."year" AS BIGINT),
+                    CAST(partition_key."month" AS BIGINT),
+                    filename,
+                    size,
+                    CAST(last_modified AS TIMESTAMP)
+                FROM (
+                    SELECT
+                        regexp_extract(
+                            filename,
+                            'locationid=(\\d+)/year=(\\d+)/month=(\\d+)/',
+                            ['location_id', 'year', 'month']
+                        ) AS partition_key,
+                        filename,
+                        size,
+                        last_modified
+                    FROM read_blob(?)
+                )
+                """, [patterns])
+            connection.execute("""
+                INSERT OR REPLACE INTO raw.source_listings
+                SELECT unnest(?), current_localtimestamp()
+                """, [numeric_ids])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        logging.info(f"Listed source partitions of {len(location_ids)} locations under {self.source_base_path}")
+
+    def discover(self, connection: DuckDBPyConnection, location_ids: List[str]) -> Dict[PartitionKey, List[SourceFile]]:
+        """Map every existing partition of the given locations to its source files"""
+        stale_location_ids = self.stale_location_ids(connection, location_ids)
+        if stale_location_ids:
+            self.refresh(connection, stale_location_ids)
+        logging.info(
+            f"Reusing cached listing for {len(location_ids) - len(stale_location_ids)} "
+            f"of {len(location_ids)} locations"
+        )
+
+        rows = connection.execute("""
+            SELECT location_id, "year", "month", filename, size, last_modified
+            FROM raw.source_files
+            WHERE location_id IN (SELECT unnest(?))
+            """, [[int(location_id) for location_id in location_ids]]).fetchall()
+
+        partitions = {}
+        for location_id, year, month, filename, size, last_modified in rows:
+            partitions.setdefault((location_id, year, month), []).append((filename, size, last_modified))
+        return partitions
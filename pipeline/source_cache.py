@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from duckdb import DuckDBPyConnection
+
+
+class SourceCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """On-disk content-addressed cache of fetched source files with LRU eviction"""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Tuple[float, int]] = {}
+        self.in_use: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_from_cache = 0
+        self.bytes_fetched = 0
+        self.evictions = 0
+        self.scan()
+
+    def scan(self) -> None:
+        """Index the files already in the cache directory"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, file)
+                stat = os.stat(path)
+                self.entries[path] = (stat.st_mtime, stat.st_size)
+                self.total_bytes += stat.st_size
+        logging.info(f"Source cache at {self.cache_dir} holds {len(self.entries)} files, {self.total_bytes} bytes")
+
+    def cache_path(self, source_path: str, size: int, last_modified: datetime) -> str:
+        """Build the cache location of a source object version
+
+        The digest directory addresses the object by path, size and modification time. The
+        locationid=/year=/month= part of the source path is kept below it so that hive
+        partitioning still works when reading from the cache.
+        """
+        digest = hashlib.sha256(f"{source_path}|{size}|{last_modified.isoformat()}".encode()).hexdigest()
+        partition_index = source_path.find("locationid=")
+        relative_path = source_path[partition_index:] if partition_index >= 0 else os.path.basename(source_path)
+        return os.path.join(self.cache_dir, digest[:2], digest, relative_path)
+
+    def fetch(self, connection: DuckDBPyConnection, source_path: str, size: int, last_modified: datetime) -> str:
+        """Return a local path holding the source object, downloading it on a cache miss
+
+        The file is pinned against eviction until it is released.
+        """
+        path = self.cache_path(source_path, size, last_modified)
+
+        with self.lock:
+            self.in_use[path] = self.in_use.get(path, 0) + 1
+            if path in self.entries:
+                try:
+                    os.utime(path)
+                    self.entries[path] = (os.stat(path).st_mtime, size)
+                    self.hits += 1
+                    self.bytes_from_cache += size
+                    return path
+                except FileNotFoundError:
+                    # Removed from disk behind the cache's back, fetched again as a miss
+                    self.total_bytes -= self.entries.pop(path)[1]
+
+        try:
+            content = connection.execute("SELECT content FROM read_blob(?)", [source_path]).fetchone()[0]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as f:
+                f.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            # The caller never receives the path, so it cannot release it
+            self.release([path])
+            raise
+
+        with self.lock:
+            if path not in self.entries:
+                self.total_bytes += len(content)
+            self.entries[path] = (os.stat(path).st_mtime, len(content))
+            self.misses += 1
+            self.bytes_fetched += len(content)
+            self.evict()
+        return path
+
+    def release(self, paths: List[str]) -> None:
+        """Unpin files returned by fetch once they have been read"""
+        with self.lock:
+            for path in paths:
+                self.in_use[path] -= 1
+                if not self.in_use[path]:
+                    del self.in_use[path]
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used files until the cache fits max_bytes"""
+        for path, (_, size) in sorted(self.entries.items(), key=lambda entry: entry[1][0]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if path in self.in_use:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self.entries[path]
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def report(self) -> None:
+        """Log cache counters for the run"""
+        lookups = self.hits + self.misses
+        hit_ratio = self.hits / lookups if lookups else 0.0
+        logging.info(
+            f"Source cache: {self.hits} hits, {self.misses} misses ({hit_ratio:.0%} hit ratio), "
+            f"{self.bytes_from_cache} bytes served from cache, {self.bytes_fetched} bytes fetched, "
+            f"{self.evictions} evictions, {self.total_bytes}/{self.max_bytes} bytes used"
+        )
@@ -0,0 +1,339 @@
+"""
+Example usage: python streaming.py --locations_file_path ../location.json --database_path ../air_quality.db --secrets_file_path ../secrets.json --poll_interval 300 --flush_rows 500 --flush_seconds 60
+"""
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+import duckdb as ddb
+
+from air_quality_merge import create_staging_table, merge_air_quality
+from database_manager import DatabaseManager
+
+# location_id, sensor_id, datetime (ISO 8601 with offset), parameter, units, value, location, lat, lon
+Reading = Tuple[int, int, str, str, str, float, str, float, float]
+SensorKey = Tuple[int, int]
+# Failed flushes are retried after a backoff that doubles up to this many seconds
+MAX_FLUSH_BACKOFF = 60.0
+
+
+class MeasurementFeed:
+    def __init__(self, latest_url: str, location_url: str, api_key: Optional[str] = None, timeout: float = 30.0):
+        """Client for a latest-measurements feed shaped like the OpenAQ v3 API
+
+        Both URL templates take a {location_id} placeholder. Any scheme supported by urllib
+        works, so file:// URLs can stand in for the API locally.
+        """
+        self.latest_url = latest_url
+        self.location_url = location_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.locations: Dict[int, Tuple[str, float, float, Dict[int, Tuple[str, str]]]] = {}
+
+    def get_json(self, url: str) -> dict:
+        """Fetch and decode a JSON document"""
+        request = urllib.request.Request(url)
+        if self.api_key:
+            request.add_header("X-API-Key", self.api_key)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def location(self, location_id: int) -> Tuple[str, float, float, Dict[int, Tuple[str, str]]]:
+        """Get a location's name, coordinates and sensor parameters, fetched once per location"""
+        if location_id not in self.locations:
+            result = self.get_json(self.location_url.format(location_id=location_id))["results"][0]
+            sensors = {
+                sensor["id"]: (sensor["parameter"]["name"], sensor["parameter"]["units"])
+                for sensor in result["sensors"]
+            }
+            coordinates = result["coordinates"]
+            self.locations[location_id] = (result["name"], coordinates["latitude"], coordinates["longitude"], sensors)
+        return self.locations[location_id]
+
+    def latest(self, location_id: int) -> List[Reading]:
+        """Fetch the latest reading of every sensor at a location"""
+        name, lat, lon, sensors = self.location(location_id)
+        readings = []
+        for result in self.get_json(self.latest_url.format(location_id=location_id))["results"]:
+            if result["sensorsId"] not in sensors or result["value"] is None:
+                continue
+            parameter, units = sensors[result["sensorsId"]]
+            readings.append((
+                location_id,
+                result["sensorsId"],
+                result["datetime"]["local"],
+                parameter,
+                units,
+                float(result["value"]),
+                name,
+                lat,
+                lon
+            ))
+        return readings
+
+
+class StreamIngestor:
+    def __init__(
+        self,
+        locations_file_path: str,
+        database_path: str,
+        feed: MeasurementFeed,
+        poll_interval: float = 300.0,
+        flush_rows: int = 500,
+        flush_seconds: float = 60.0,
+        max_buffered: int = 10000,
+        flush_backoff: float = 1.0
+    ):
+        """Poll a measurements feed and upsert readings into raw.air_quality in micro-batches"""
+        self.locations_file_path = locations_file_path
+        self.database_path = database_path
+        self.feed = feed
+        self.poll_interval = poll_interval
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.flush_backoff = flush_backoff
+        self.db_manager = DatabaseManager(database_path)
+        self.staging_table = "raw_air_quality_stream_staging"
+        # Bounded so a slow database blocks polling instead of growing memory without limit
+        self.buffer: "queue.Queue[Reading]" = queue.Queue(maxsize=max_buffered)
+        self.last_flushed: Dict[SensorKey, str] = {}
+        self.stop_event = threading.Event()
+        self.rows_flushed = 0
+
+    def read_location_ids(self) -> List[int]:
+        """Read location IDs from JSON file"""
+        with open(self.locations_file_path, "r") as f:
+            location = json.load(f)
+        return [int(id) for id in location.keys()]
+
+    def poll(self, location_ids: List[int]) -> None:
+        """Fetch the latest readings of every location into the buffer once"""
+        for location_id in location_ids:
+            try:
+                readings = self.feed.latest(location_id)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                logging.warning(f"Could not poll location {location_id}: {e}")
+                continue
+            for reading in readings:
+                self.buffer.put(reading)
+
+    def poll_forever(self, location_ids: List[int], max_polls: Optional[int] = None) -> None:
+        """Poll every poll_interval seconds until stopped"""
+        polls = 0
+        while not self.stop_event.is_set():
+            self.poll(location_ids)
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                break
+            self.stop_event.wait(self.poll_interval)
+
+    def drain(self) -> List[Reading]:
+        """Collect buffered readings until flush_rows are pending or flush_seconds have passed"""
+        pending = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(pending) < self.flush_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                pending.append(self.buffer.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return pending
+
+    def deduplicate(self, readings: List[Reading]) -> List[Reading]:
+        """Drop readings already flushed or repeated within the batch
+
+        A latest-values feed returns the same reading on every poll until the sensor reports
+        again, so only readings newer than the last flushed one per sensor are kept.
+        """
+        latest: Dict[Tuple, Reading] = {}
+        for reading in readings:
+            location_id, sensor_id, datetime_, parameter = reading[:4]
+            if datetime_ <= self.last_flushed.get((location_id, sensor_id), ""):
+                continue
+            latest[(location_id, sensor_id, datetime_, parameter)] = reading
+        return list(latest.values())
+
+    def flush(self, readings: List[Reading]) -> int:
+        """Upsert a micro-batch into raw.air_quality
+
+        The database is only opened for the duration of the flush so other processes such as
+        the dashboard can open it between flushes.
+        """
+        readings = self.deduplicate(readings)
+        if not readings:
+            return 0
+
+        connection = self.db_manager.connect()
+        try:
+            create_staging_table(connection, self.staging_table)
+            connection.executemany(f"""
+                INSERT INTO {self.staging_table} BY NAME
+                SELECT
+                    $1 AS location_id,
+                    $2 AS sensor_id,
+                    CAST(CAST($3 AS TIMESTAMPTZ) AS TIMESTAMP) AS "datetime",
+                    $4 AS "parameter",
+                    $5 AS units,
+                    $6 AS "value",
+                    month(CAST(left($3, 10) AS DATE)) AS "month",
+                    year(CAST(left($3, 10) AS DATE)) AS "year",
+                    $7 AS "location",
+                    $8 AS lat,
+                    $9 AS lon,
+                    current_timestamp AS ingestion_datetime
+                """, readings)
+            connection.begin()
+            try:
+                merge_air_quality(connection, self.staging_table)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        finally:
+            self.db_manager.close()
+
+        for location_id, sensor_id, datetime_, *_ in readings:
+            key = (location_id, sensor_id)
+            self.last_flushed[key] = max(datetime_, self.last_flushed.get(key, ""))
+        self.rows_flushed += len(readings)
+        logging.info(f"Flushed {len(readings)} readings ({self.buffer.qsize()} still buffered)")
+        return len(readings)
+
+    def run(self, max_polls: Optional[int] = None) -> None:
+        """Run the poller in a background thread and flush micro-batches until stopped"""
+        location_ids = self.read_location_ids()
+        poller = threading.Thread(
+            target=self.poll_forever,
+            args=(location_ids, max_polls),
+            name="feed-poller",
+            daemon=True
+        )
+        poller.start()
+        logging.info(
+            f"Streaming {len(location_ids)} locations every {self.poll_interval}s, flushing at "
+            f"{self.flush_rows} rows or {self.flush_seconds}s"
+        )
+
+        # Readings of failed flushes, retried with the next batch
+        pending: List[Reading] = []
+        backoff = self.flush_backoff
+        try:
+            while poller.is_alive() or not self.buffer.empty() or pending:
+                pending.extend(self.drain())
+                try:
+                    self.flush(pending)
+                except (ddb.Error, OSError) as e:
+                    # The database may be locked by another process, keep the batch instead of
+                    # dropping it. Deduplicated so repeated latest readings do not pile up
+                    pending = self.deduplicate(pending)
+                    logging.warning(f"Could not flush {len(pending)} readings, retrying in {backoff:.0f}s: {e}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_FLUSH_BACKOFF)
+                    continue
+                pending = []
+                backoff = self.flush_backoff
+        except KeyboardInterrupt:
+            logging.info("Stopping stream ingestion")
+            self.stop_event.set()
+            pending.extend(self.drain_nowait())
+            try:
+                self.flush(pending)
+            except (ddb.Error, OSError) as e:
+                logging.error(f"Dropped {len(pending)} readings that could not be flushed: {e}")
+        logging.info(f"Flushed {self.rows_flushed} readings in total")
+
+    def drain_nowait(self) -> List[Reading]:
+        """Collect everything currently buffered without waiting"""
+        pending = []
+        while True:
+            try:
+                pending.append(self.buffer.get_nowait())
+            except queue.Empty:
+                return pending
+
+
+def main():
+    logging.getLogger().setLevel(logging.INFO)
+    parser = argparse.ArgumentParser(description="CLI for near-real-time ingestion")
+    parser.add_argument(
+        "--locations_file_path",
+        type=str,
+        required=True,
+        help="Path to the locations JSON file",
+    )
+    parser.add_argument(
+        "--database_path",
+        type=str,
+        required=True,
+        help="Path to the database"
+    )
+    parser.add_argument(
+        "--secrets_file_path",
+        type=str,
+        default=None,
+        help="Path to the secrets JSON file holding the openaq-api-key",
+    )
+    parser.add_argument(
+        "--latest_url",
+        type=str,
+        default="https://api.openaq.org/v3/locations/{location_id}/latest",
+        help="URL template of the latest measurements of a location",
+    )
+    parser.add_argument(
+        "--location_url",
+        type=str,
+        default="https://api.openaq.org/v3/locations/{location_id}",
+        help="URL template of a location's metadata and sensors",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=300.0,
+        help="Seconds between polls of the feed",
+    )
+    parser.add_argument(
+        "--flush_rows",
+        type=int,
+        default=500,
+        help="Flush a micro-batch once this many readings are buffered",
+    )
+    parser.add_argument(
+        "--flush_seconds",
+        type=float,
+        default=60.0,
+        help="Flush a micro-batch at least this often",
+    )
+    parser.add_argument(
+        "--max_buffered",
+        type=int,
+        default=10000,
+        help="Readings buffered before polling blocks",
+    )
+
+    args = parser.parse_args()
+
+    api_key = None
+    if args.secrets_file_path:
+        with open(args.secrets_file_path, "r") as f:
+            api_key = json.load(f).get("openaq-api-key")
+
+    ingestor = StreamIngestor(
+        locations_file_path=args.locations_file_path,
+        database_path=args.database_path,
+        feed=MeasurementFeed(args.latest_url, args.location_url, api_key),
+        poll_interval=args.poll_interval,
+        flush_rows=args.flush_rows,
+        flush_seconds=args.flush_seconds,
+        max_buffered=args.max_buffered
+    )
+    ingestor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from typing import Dict
+
+from duckdb import DuckDBPyConnection
+
+
+def bump_table_version(connection: DuckDBPyConnection, table_name: str) -> None:
+    """Record that a table's data changed so downstream consumers can detect it"""
+    connection.execute("""
+        INSERT INTO raw.table_versions VALUES (?, 1, current_localtimestamp())
+        ON CONFLICT (table_name) DO UPDATE
+        SET "version" = "version" + 1, updated_at = excluded.updated_at
+        """, [table_name])
+
+
+def read_table_versions(connection: DuckDBPyConnection) -> Dict[str, int]:
+    """Read the current data version of every tracked table"""
+    return dict(connection.execute('SELECT table_name, "version" FROM raw.table_versions').fetchall())
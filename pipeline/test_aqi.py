@@ -0,0 +1,70 @@
+import os
+import time
+import unittest
+
+import duckdb as ddb
+import numpy as np
+
+from aqi import AQI_BREAKPOINTS, aqi, aqi_category
+
+AQI_MACROS_PATH = os.path.join(os.path.dirname(__file__), "..", "sql", "ddl", "6_presentation_aqi_macros.sql")
+
+
+class TestAqi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connection = ddb.connect()
+        cls.connection.execute("CREATE SCHEMA presentation")
+        with open(AQI_MACROS_PATH, "r", encoding="utf-8") as f:
+            cls.connection.execute(f.read())
+        print("\n🧪 Starting Test Suite for AQI")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def test_001_breakpoint_values(self):
+        values = aqi("pm25", [0.0, 12.0, 12.05, 35.4, 35.5, 55.5, 1000.0, np.nan])
+        np.testing.assert_array_equal(values, [0, 50, 50, 100, 101, 151, 500, np.nan])
+        self.assertEqual(aqi("co", [5.0])[0], 56)
+        self.assertEqual(aqi("no2", [0.101], units="ppm")[0], 101)
+        self.assertTrue(np.isnan(aqi("bc", [1.0])[0]))
+        print("✅ TC001 passed: AQI interpolated within the EPA breakpoints.")
+
+    def test_002_categories(self):
+        categories = aqi_category([50, 51, 150, 201, 301, np.nan])
+        self.assertEqual(
+            categories.tolist(),
+            ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Very Unhealthy", "Hazardous", None]
+        )
+        print("✅ TC002 passed: AQI values categorized.")
+
+    def test_003_sql_macro_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        for parameter, table in AQI_BREAKPOINTS.items():
+            values = np.round(rng.uniform(0, table.c_high[-1] * 1.1, 2000), table.decimals + 1)
+            expected = aqi(parameter, values, table.units)
+            actual = self.connection.execute(
+                "SELECT presentation.aqi($parameter, unnest($values), $units)",
+                {"parameter": parameter, "values": values.tolist(), "units": table.units}
+            ).fetchnumpy()
+            np.testing.assert_array_equal(next(iter(actual.values())), expected, err_msg=parameter)
+            categories = self.connection.execute(
+                "SELECT presentation.aqi_category(unnest($values))", {"values": expected.tolist()}
+            ).fetchnumpy()
+            self.assertEqual(next(iter(categories.values())).tolist(), aqi_category(expected).tolist())
+        self.assertIsNone(self.connection.execute("SELECT presentation.aqi('pm25', NULL, 'µg/m³')").fetchone()[0])
+        print("✅ TC003 passed: SQL macros agree with the vectorized AQI.")
+
+    def test_004_million_readings(self):
+        values = np.random.default_rng(0).uniform(0, 300, 1_000_000)
+        started = time.perf_counter()
+        categories = aqi_category(aqi("pm25", values))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(len(categories), 1_000_000)
+        self.assertLess(elapsed, 1.0)
+        print(f"✅ TC004 passed: 1,000,000 PM2.5 readings categorized in {elapsed * 1000:.0f} ms.")
+
+if __name__ == '__main__':
+    unittest.main()
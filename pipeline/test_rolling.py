@@ -0,0 +1,85 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+import duckdb as ddb
+import numpy as np
+import pandas as pd
+from jinja2 import Template
+
+SQL_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "sql")
+AQI_MACROS_PATH = os.path.join(SQL_DIRECTORY, "ddl", "6_presentation_aqi_macros.sql")
+ROLLING_PATH = os.path.join(
+    SQL_DIRECTORY, "dml", "presentation", "sql", "dml", "presentation", "7_presentation_air_quality_rolling_table.sql"
+)
+FIRST_INGESTION = datetime(2025, 1, 4)
+LATE_INGESTION = datetime(2025, 1, 5)
+
+
+class TestRolling(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.connection = ddb.connect()
+        cls.connection.execute("CREATE SCHEMA presentation")
+        with open(AQI_MACROS_PATH, "r", encoding="utf-8") as f:
+            cls.connection.execute(f.read())
+        with open(ROLLING_PATH, "r", encoding="utf-8") as f:
+            cls.rolling_query = Template(f.read())
+        cls.connection.execute("""
+            CREATE TABLE presentation.air_quality (
+                location_id INTEGER, sensor_id INTEGER, "parameter" VARCHAR, units VARCHAR,
+                "datetime" TIMESTAMP, "value" DOUBLE, ingestion_datetime TIMESTAMP
+            )
+        """)
+        # Three days of readings with gaps, then late readings filling some gaps, revising
+        # hours already reported and running past the end, plus a sensor that is new
+        rng = np.random.default_rng(0)
+        start = datetime(2025, 1, 1)
+        rows = []
+        for sensor_id, parameter, units in [(1, "pm25", "µg/m³"), (2, "pm10", "µg/m³"), (3, "o3", "ppm")]:
+            for hour in range(72):
+                if rng.random() < 0.8:
+                    for minute in (0, 30):
+                        rows.append((1, sensor_id, parameter, units, start + timedelta(hours=hour, minutes=minute),
+                                     float(rng.uniform(0, 80) if units != "ppm" else rng.uniform(0, 0.1)), FIRST_INGESTION))
+        cls.late_rows = []
+        for sensor_id, parameter, units in [(1, "pm25", "µg/m³"), (2, "pm10", "µg/m³"), (4, "pm25", "µg/m³")]:
+            for hour in list(range(30, 40)) + list(range(70, 80)):
+                cls.late_rows.append((1, sensor_id, parameter, units, start + timedelta(hours=hour, minutes=15),
+                                      float(rng.uniform(0, 80)), LATE_INGESTION))
+        cls.connection.executemany("INSERT INTO presentation.air_quality VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        print("\n🧪 Starting Test Suite for rolling metrics")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def test_001_incremental_run_matches_full_build(self):
+        self.connection.execute(self.rolling_query.render(watermark=None))
+        self.connection.executemany("INSERT INTO presentation.air_quality VALUES (?, ?, ?, ?, ?, ?, ?)", self.late_rows)
+        self.connection.execute(self.rolling_query.render(watermark=FIRST_INGESTION))
+        self.connection.execute("CREATE TABLE incremental AS SELECT * FROM presentation.air_quality_rolling")
+        self.connection.execute(self.rolling_query.render(watermark=None))
+
+        # Window sums may add up in another order, so values are compared to within rounding
+        order = " ORDER BY location_id, sensor_id, parameter, period_start"
+        incremental = self.connection.execute("SELECT * FROM incremental" + order).df()
+        full = self.connection.execute("SELECT * FROM presentation.air_quality_rolling" + order).df()
+        pd.testing.assert_frame_equal(incremental, full, rtol=1e-12)
+        print(f"✅ TC001 passed: Incremental run matches the full build over {len(full)} rows.")
+
+    def test_002_nowcast_only_for_particulates(self):
+        self.connection.execute(self.rolling_query.render(watermark=None))
+        counts = dict(self.connection.execute("""
+            SELECT parameter, count(nowcast)
+            FROM presentation.air_quality_rolling
+            GROUP BY parameter
+        """).fetchall())
+        self.assertGreater(counts["pm25"], 0)
+        self.assertGreater(counts["pm10"], 0)
+        self.assertEqual(counts["o3"], 0, "NowCast weights only apply to particulates")
+        print("✅ TC002 passed: NowCast computed for particulates only.")
+
+if __name__ == '__main__':
+    unittest.main()
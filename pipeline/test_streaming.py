@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import duckdb as ddb
+
+from connection_manager import ConnectionManager
+from database_manager import DatabaseManager
+from streaming import MeasurementFeed, StreamIngestor
+
+DDL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql", "ddl")
+
+
+class TestStreamIngestor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        root = cls.workdir.name
+        cls.database_path = os.path.join(root, "air_quality.db")
+        DatabaseManager(cls.database_path, DDL_DIR).setup()
+
+        # Local file stand-in for the OpenAQ v3 location and latest endpoints
+        with open(os.path.join(root, "location-100.json"), "w") as f:
+            json.dump({"results": [{
+                "id": 100,
+                "name": "Alpha",
+                "coordinates": {"latitude": 14.5, "longitude": 121.0},
+                "sensors": [{"id": 1000, "parameter": {"name": "pm25", "units": "µg/m³"}}]
+            }]}, f)
+        cls.latest_path = os.path.join(root, "latest-100.json")
+        cls.write_latest("2024-04-01T10:00:00+08:00", 31.5)
+        with open(os.path.join(root, "locations.json"), "w") as f:
+            json.dump({"100": "Alpha"}, f)
+
+        feed = MeasurementFeed(
+            latest_url=f"file://{root}/latest-{{location_id}}.json",
+            location_url=f"file://{root}/location-{{location_id}}.json"
+        )
+        cls.ingestor = StreamIngestor(
+            locations_file_path=os.path.join(root, "locations.json"),
+            database_path=cls.database_path,
+            feed=feed,
+            poll_interval=0,
+            flush_rows=10,
+            flush_seconds=0.1,
+            flush_backoff=0.01
+        )
+        print("\n🧪 Starting Test Suite for StreamIngestor")
+
+    @classmethod
+    def tearDownClass(cls):
+        ConnectionManager.close_all()
+        cls.workdir.cleanup()
+
+    @classmethod
+    def write_latest(cls, local_datetime, value):
+        with open(cls.latest_path, "w") as f:
+            json.dump({"results": [{
+                "datetime": {"local": local_datetime},
+                "value": value,
+                "sensorsId": 1000,
+                "locationsId": 100
+            }]}, f)
+
+    def count_rows(self):
+        with ConnectionManager.get(self.database_path).cursor() as connection:
+            return connection.execute("SELECT count(*) FROM raw.air_quality").fetchone()[0]
+
+    def test_001_feed_parses_latest_readings(self):
+        readings = self.ingestor.feed.latest(100)
+        self.assertEqual(len(readings), 1)
+        self.assertEqual(readings[0][3:6], ("pm25", "µg/m³", 31.5))
+        print("✅ TC001 passed: Feed readings parsed from the local stand-in.")
+
+    def test_002_repeated_polls_are_deduplicated(self):
+        self.ingestor.run(max_polls=3)
+        self.assertEqual(self.count_rows(), 1)
+        print("✅ TC002 passed: Repeated latest readings flushed once.")
+
+    def test_003_new_readings_are_appended(self):
+        self.write_latest("2024-04-01T11:00:00+08:00", 40.0)
+        self.ingestor.run(max_polls=2)
+        self.assertEqual(self.count_rows(), 2)
+        with ConnectionManager.get(self.database_path).cursor() as connection:
+            month, year = connection.execute(
+                'SELECT "month", "year" FROM raw.air_quality WHERE "value" = 40.0'
+            ).fetchone()
+        self.assertEqual((month, year), (4, 2024))
+        print("✅ TC003 passed: New readings flushed as a micro-batch.")
+
+    def test_004_failed_flush_is_retried(self):
+        self.write_latest("2024-04-01T12:00:00+08:00", 45.0)
+        flush = self.ingestor.flush
+        failures = [ddb.IOException("Could not set lock on file")]
+
+        def flaky_flush(readings):
+            if failures and readings:
+                raise failures.pop()
+            return flush(readings)
+
+        with mock.patch.object(self.ingestor, "flush", side_effect=flaky_flush):
+            self.ingestor.run(max_polls=1)
+        self.assertEqual(self.count_rows(), 3, "Readings of the failed flush were dropped")
+        print("✅ TC004 passed: Readings of a failed flush retried with the next batch.")
+
+if __name__ == '__main__':
+    unittest.main()
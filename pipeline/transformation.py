@@ -1,45 +1,283 @@
 import argparse
+import hashlib
 import logging
-from typing import List
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Set
 
+from duckdb import DuckDBPyConnection
+from jinja2 import Template
+
+from connection_manager import ConnectionManager
 from database_manager import DatabaseManager
+from table_versions import bump_table_version, read_table_versions
+
+CREATED_RELATION_PATTERN = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP\s+|TEMPORARY\s+)?(?P<kind>TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?(?P<name>\w+\.\w+)",
+    re.IGNORECASE
+)
+REFERENCED_RELATION_PATTERN = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+(?P<name>\w+\.\w+)", re.IGNORECASE)
+# Rows committed by a transaction that started before the previous refresh can carry an older
+# ingestion_datetime than its watermark, so incremental runs look back a little further
+WATERMARK_LOOKBACK = timedelta(hours=1)
+
+
+class TransformationNode(NamedTuple):
+    path: str
+    query: str
+    relation: str
+    kind: str
+    references: Set[str]
+    sql_hash: str
+
 
 class DataTransformer:
-    def __init__(self, database_path: str, query_directory: str):
+    def __init__(self, database_path: str, query_directory: str, workers: int = 1, force: bool = False):
         """Initialize DataTransformer with database and query paths"""
         self.database_path = database_path
         self.query_directory = query_directory
+        self.workers = max(1, workers)
+        self.force = force
         self.db_manager = DatabaseManager(database_path, query_directory)
+        self.timings: List[tuple] = []
+        self.watermark: Optional[datetime] = None
         logging.getLogger().setLevel(logging.INFO)
 
+    def parse_node(self, query_path: str) -> TransformationNode:
+        """Parse the relation a script creates and the relations it reads"""
+        query = self.db_manager.read_query(query_path)
+        created = CREATED_RELATION_PATTERN.search(query)
+        if created is None:
+            raise ValueError(f"No CREATE TABLE or CREATE VIEW statement found in {query_path}")
+        relation = created.group("name").lower()
+        references = {match.group("name").lower() for match in REFERENCED_RELATION_PATTERN.finditer(query)}
+        return TransformationNode(
+            path=query_path,
+            query=query,
+            relation=relation,
+            kind=created.group("kind").upper(),
+            references=references - {relation},
+            sql_hash=hashlib.sha256(query.encode()).hexdigest()
+        )
+
+    @staticmethod
+    def plan_levels(nodes: Dict[str, TransformationNode]) -> List[List[TransformationNode]]:
+        """Group nodes into levels whose members only depend on earlier levels"""
+        remaining = {relation: node.references & nodes.keys() for relation, node in nodes.items()}
+        levels = []
+        while remaining:
+            ready = sorted(relation for relation, dependencies in remaining.items() if not dependencies)
+            if not ready:
+                raise ValueError(f"Cyclic dependencies between transformations: {sorted(remaining)}")
+            levels.append([nodes[relation] for relation in ready])
+            for relation in ready:
+                del remaining[relation]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return levels
+
+    @staticmethod
+    def upstream_version(
+        node: TransformationNode,
+        nodes: Dict[str, TransformationNode],
+        table_versions: Dict[str, int],
+        catalog_views: Dict[str, Set[str]]
+    ) -> str:
+        """Describe the data a table node is built from as the versions of the tables it reads
+
+        Views are followed through to the tables beneath them, whether created by a node or
+        directly in the database. View nodes do not hold data, so their upstream version is
+        empty and only their SQL decides whether they re-run.
+        """
+        if node.kind == "VIEW":
+            return ""
+        tables = set()
+        followed = set()
+        pending = list(node.references)
+        while pending:
+            relation = pending.pop()
+            upstream = nodes.get(relation)
+            if upstream is not None and upstream.kind == "VIEW":
+                view_references = upstream.references
+            elif upstream is None and relation in catalog_views:
+                view_references = catalog_views[relation]
+            else:
+                tables.add(relation)
+                continue
+            if relation not in followed:
+                followed.add(relation)
+                pending.extend(view_references)
+        return ",".join(f"{table}={table_versions.get(table, 0)}" for table in sorted(tables))
+
+    @staticmethod
+    def read_catalog_views(connection: DuckDBPyConnection) -> Dict[str, Set[str]]:
+        """Read the relations referenced by every view defined in the database"""
+        return {
+            f"{schema}.{name}".lower(): {
+                match.group("name").lower() for match in REFERENCED_RELATION_PATTERN.finditer(sql)
+            }
+            for schema, name, sql in connection.execute(
+                "SELECT schema_name, view_name, sql FROM duckdb_views() WHERE NOT internal"
+            ).fetchall()
+        }
+
+    @staticmethod
+    def existing_kind(connection: DuckDBPyConnection, relation: str) -> Optional[str]:
+        """Look up whether a relation currently exists as a TABLE or a VIEW"""
+        schema, name = relation.split(".")
+        row = connection.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+            [schema, name]
+        ).fetchone()
+        if row is None:
+            return None
+        return "VIEW" if row[0] == "VIEW" else "TABLE"
+
+    def execute_node(
+        self,
+        connection: DuckDBPyConnection,
+        node: TransformationNode,
+        upstream_version: str,
+        previous_state: Optional[tuple]
+    ) -> None:
+        """Run one transformation, incrementally when its table is already built from the same SQL
+
+        Scripts are Jinja templates receiving the watermark of their previous refresh, or None
+        when they must rebuild from scratch.
+        """
+        started = time.perf_counter()
+        existing_kind = self.existing_kind(connection, node.relation)
+        if existing_kind not in (None, node.kind):
+            connection.execute(f"DROP {existing_kind} {node.relation}")
+            existing_kind = None
+
+        watermark = None
+        if (
+            node.kind == "TABLE"
+            and existing_kind == "TABLE"
+            and not self.force
+            and previous_state is not None
+            and previous_state[0] == node.sql_hash
+            and previous_state[2] is not None
+        ):
+            watermark = previous_state[2] - WATERMARK_LOOKBACK
+
+        connection.execute(Template(node.query).render(watermark=watermark))
+        if node.kind == "TABLE":
+            bump_table_version(connection, node.relation)
+        connection.execute(
+            "INSERT OR REPLACE INTO raw.transformation_state VALUES (?, ?, ?, current_localtimestamp(), ?)",
+            [node.relation, node.sql_hash, upstream_version, self.watermark]
+        )
+        elapsed = time.perf_counter() - started
+        if node.kind == "VIEW":
+            outcome = "executed"
+        else:
+            outcome = "full" if watermark is None else "incremental"
+        self.timings.append((node.relation, outcome, elapsed))
+        logging.info(f"Executed transformation query from {node.path} ({outcome}) in {elapsed:.2f}s")
+
     def transform_data(self) -> None:
-        """Execute transformation queries in sequence"""
+        """Execute transformation queries in dependency order, skipping unchanged ones"""
         try:
-            # Get all transformation queries
+            # Get all transformation queries and order them by the relations they read
             query_paths = self.db_manager.collect_query_paths()
-            
+            nodes = {node.relation: node for node in map(self.parse_node, query_paths)}
+            levels = self.plan_levels(nodes)
+
             # Connect to database
-            self.db_manager.connect()
-            
-            # Execute each transformation query
-            for query_path in query_paths:
-                query = self.db_manager.read_query(query_path)
-                self.db_manager.execute_query(query)
-                logging.info(f"Executed transformation query from {query_path}")
-                
+            connection = self.db_manager.connect()
+            state = {
+                node: (sql_hash, upstream_version, watermark)
+                for node, sql_hash, upstream_version, watermark in connection.execute(
+                    "SELECT node, sql_hash, upstream_version, watermark FROM raw.transformation_state"
+                ).fetchall()
+            }
+            started = time.perf_counter()
+
+            if self.workers == 1:
+                # One transaction, so readers never see a partially refreshed presentation layer
+                connection.begin()
+                try:
+                    self.watermark = self.read_watermark(connection)
+                    for level in levels:
+                        self.run_level(connection, level, nodes, state)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+            else:
+                # Nodes of a level run concurrently, each on its own cursor and transaction
+                self.watermark = self.read_watermark(connection)
+                for level in levels:
+                    self.run_level(connection, level, nodes, state)
+
+            self.report(time.perf_counter() - started)
+
         except Exception as e:
             logging.error(f"Error during transformation: {str(e)}")
             raise
         finally:
             self.db_manager.close()
 
+    @staticmethod
+    def read_watermark(connection: DuckDBPyConnection) -> Optional[datetime]:
+        """Latest ingestion time visible to this refresh, stored so the next run can start after it"""
+        return connection.execute("SELECT max(ingestion_datetime) FROM raw.air_quality").fetchone()[0]
+
+    def run_level(
+        self,
+        connection: DuckDBPyConnection,
+        level: List[TransformationNode],
+        nodes: Dict[str, TransformationNode],
+        state: Dict[str, tuple]
+    ) -> None:
+        """Execute the stale nodes of one dependency level"""
+        table_versions = read_table_versions(connection)
+        catalog_views = self.read_catalog_views(connection)
+        stale = []
+        for node in level:
+            upstream_version = self.upstream_version(node, nodes, table_versions, catalog_views)
+            if not self.force and state.get(node.relation, ())[:2] == (node.sql_hash, upstream_version):
+                self.timings.append((node.relation, "skipped", 0.0))
+                logging.info(f"Skipped unchanged transformation {node.relation}")
+                continue
+            stale.append((node, upstream_version, state.get(node.relation)))
+
+        if self.workers == 1:
+            for node, upstream_version, previous_state in stale:
+                self.execute_node(connection, node, upstream_version, previous_state)
+            return
+
+        def run(stale_node):
+            with ConnectionManager.get(self.database_path).cursor() as cursor:
+                try:
+                    cursor.begin()
+                    self.execute_node(cursor, *stale_node)
+                    cursor.commit()
+                except Exception:
+                    cursor.rollback()
+                    raise
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(run, stale))
+
+    def report(self, elapsed: float) -> None:
+        """Log the per-node timing report"""
+        for relation, outcome, seconds in self.timings:
+            logging.info(f"{seconds:8.2f}s {outcome:>11}  {relation}")
+        executed = sum(1 for _, outcome, _ in self.timings if outcome != "skipped")
+        logging.info(f"Executed {executed} of {len(self.timings)} transformations in {elapsed:.2f}s")
+
 def main():
     # Setup argument parser
     parser = argparse.ArgumentParser(description="CLI for Data Transformation")
     parser.add_argument(
-        "--database_path", 
-        type=str, 
-        required=True, 
+        "--database_path",
+        type=str,
+        required=True,
         help="Path to the DuckDB database"
     )
     parser.add_argument(
@@ -48,16 +286,29 @@ def main():
         required=True,
         help="Directory containing SQL transformation queries",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Run independent transformations concurrently, each in its own transaction",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Run every transformation even if its SQL and upstream data are unchanged",
+    )
 
     # Parse arguments and run transformation
     args = parser.parse_args()
-    
+
     transformer = DataTransformer(
         database_path=args.database_path,
-        query_directory=args.query_directory
+        query_directory=args.query_directory,
+        workers=args.workers,
+        force=args.force
     )
     transformer.transform_data()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,14 +1,23 @@
+CREATE TABLE IF NOT EXISTS raw.locations (
+    location_id BIGINT PRIMARY KEY,
+    "location" VARCHAR,
+    lat DOUBLE,
+    lon DOUBLE
+);
+
 CREATE TABLE IF NOT EXISTS raw.air_quality (
     location_id BIGINT,
     sensor_id BIGINT,
-    "location" VARCHAR,
     "datetime" TIMESTAMP,
-    lat DOUBLE,
-    lon DOUBLE,
     "parameter" VARCHAR,
     units VARCHAR,
     "value" DOUBLE,
-    "month" VARCHAR,
-    "year" BIGINT,
+    "month" UTINYINT,
+    "year" SMALLINT,
     ingestion_datetime TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- Hot and archived raw rows. Replaced by `database_manager.py --archive-older-than` with a union
+-- over the Parquet archive, so re-running the DDL must not reset it.
+CREATE VIEW IF NOT EXISTS raw.air_quality_all AS
+SELECT * FROM raw.air_quality;
\ No newline at end of file
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS raw.ingestion_manifest (
+    location_id BIGINT,
+    "year" BIGINT,
+    "month" BIGINT,
+    files VARCHAR[],
+    file_sizes BIGINT[],
+    file_mtimes TIMESTAMP[],
+    row_count BIGINT,
+    ingestion_datetime TIMESTAMP,
+    PRIMARY KEY (location_id, "year", "month")
+);
\ No newline at end of file
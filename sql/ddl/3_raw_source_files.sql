@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS raw.source_listings (
+    location_id BIGINT PRIMARY KEY,
+    listed_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS raw.source_files (
+    location_id BIGINT,
+    "year" BIGINT,
+    "month" BIGINT,
+    filename VARCHAR,
+    size BIGINT,
+    last_modified TIMESTAMP
+);
\ No newline at end of file
@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS raw.table_versions (
+    table_name VARCHAR PRIMARY KEY,
+    "version" BIGINT,
+    updated_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS raw.transformation_state (
+    node VARCHAR PRIMARY KEY,
+    sql_hash VARCHAR,
+    upstream_version VARCHAR,
+    refreshed_at TIMESTAMP,
+    watermark TIMESTAMP
+);
+
+ALTER TABLE raw.transformation_state ADD COLUMN IF NOT EXISTS watermark TIMESTAMP;
\ No newline at end of file
@@ -0,0 +1,23 @@
+-- Mergeable quantile sketch: a log-scaled histogram stored as a list of
+-- {bucket, bucket_count} structs. Bucket b holds values in (1.02^(b-1), 1.02^b], so quantiles
+-- read back from it are within about 1% of the exact value. Sketches of any groups merge by
+-- summing their counts per bucket.
+CREATE OR REPLACE MACRO presentation.sketch_bucket(v) AS
+    CASE WHEN v <= 0 THEN CAST(-32768 AS SMALLINT) ELSE CAST(ceil(ln(v) / ln(1.02)) AS SMALLINT) END;
+
+CREATE OR REPLACE MACRO presentation.sketch_value(b) AS
+    CASE WHEN b = -32768 THEN 0.0 ELSE 2 * pow(1.02, b) / 2.02 END;
+
+CREATE OR REPLACE MACRO presentation.sketch_quantile(sketch, q) AS
+    presentation.sketch_value(
+        list_sort(sketch)[
+            list_position(
+                list_transform(
+                    range(1, len(sketch) + 1),
+                    i -> list_sum(list_transform(list_sort(sketch)[1:i], entry -> entry.bucket_count))
+                        >= q * list_sum(list_transform(sketch, entry -> entry.bucket_count))
+                ),
+                true
+            )
+        ].bucket
+    );
\ No newline at end of file
@@ -0,0 +1,118 @@
+-- US EPA Air Quality Index, kept in step with the breakpoint tables in pipeline/aqi.py (PM2.5 uses
+-- the table in force before 2024). Each pollutant macro takes a concentration in its table's
+-- units, truncated to the table's precision, and interpolates within the segment with the
+-- highest lower bound not above it. Concentrations above a table are capped at 500.
+-- greatest() and least() skip NULLs, so these macros use CASE to keep a NULL concentration NULL
+CREATE OR REPLACE MACRO presentation.aqi_truncate(concentration, decimals) AS
+    floor(CASE WHEN concentration < 0 THEN 0.0 ELSE CAST(concentration AS DOUBLE) END * pow(10, decimals) + 1e-9)
+        / pow(10, decimals);
+
+CREATE OR REPLACE MACRO presentation.aqi_interpolate(c, c_low, c_high, i_low, i_high) AS
+    CAST(round(least((i_high - i_low) / (c_high - c_low) * (c - c_low) + i_low, i_high)) AS INTEGER);
+
+-- pm25 in µg/m³, 24-hour
+CREATE OR REPLACE MACRO presentation.aqi_pm25(c) AS
+    CASE
+        WHEN c < 12.1 THEN presentation.aqi_interpolate(c, 0.0, 12.0, 0, 50)
+        WHEN c < 35.5 THEN presentation.aqi_interpolate(c, 12.1, 35.4, 51, 100)
+        WHEN c < 55.5 THEN presentation.aqi_interpolate(c, 35.5, 55.4, 101, 150)
+        WHEN c < 150.5 THEN presentation.aqi_interpolate(c, 55.5, 150.4, 151, 200)
+        WHEN c < 250.5 THEN presentation.aqi_interpolate(c, 150.5, 250.4, 201, 300)
+        WHEN c < 350.5 THEN presentation.aqi_interpolate(c, 250.5, 350.4, 301, 400)
+        WHEN c >= 350.5 THEN presentation.aqi_interpolate(c, 350.5, 500.4, 401, 500)
+    END;
+
+-- pm10 in µg/m³, 24-hour
+CREATE OR REPLACE MACRO presentation.aqi_pm10(c) AS
+    CASE
+        WHEN c < 55 THEN presentation.aqi_interpolate(c, 0, 54, 0, 50)
+        WHEN c < 155 THEN presentation.aqi_interpolate(c, 55, 154, 51, 100)
+        WHEN c < 255 THEN presentation.aqi_interpolate(c, 155, 254, 101, 150)
+        WHEN c < 355 THEN presentation.aqi_interpolate(c, 255, 354, 151, 200)
+        WHEN c < 425 THEN presentation.aqi_interpolate(c, 355, 424, 201, 300)
+        WHEN c < 505 THEN presentation.aqi_interpolate(c, 425, 504, 301, 400)
+        WHEN c >= 505 THEN presentation.aqi_interpolate(c, 505, 604, 401, 500)
+    END;
+
+-- o3 in ppm, 8-hour up to 0.200 then 1-hour
+CREATE OR REPLACE MACRO presentation.aqi_o3(c) AS
+    CASE
+        WHEN c < 0.055 THEN presentation.aqi_interpolate(c, 0.000, 0.054, 0, 50)
+        WHEN c < 0.071 THEN presentation.aqi_interpolate(c, 0.055, 0.070, 51, 100)
+        WHEN c < 0.086 THEN presentation.aqi_interpolate(c, 0.071, 0.085, 101, 150)
+        WHEN c < 0.106 THEN presentation.aqi_interpolate(c, 0.086, 0.105, 151, 200)
+        WHEN c < 0.405 THEN presentation.aqi_interpolate(c, 0.106, 0.200, 201, 300)
+        WHEN c < 0.505 THEN presentation.aqi_interpolate(c, 0.405, 0.504, 301, 400)
+        WHEN c >= 0.505 THEN presentation.aqi_interpolate(c, 0.505, 0.604, 401, 500)
+    END;
+
+-- no2 in ppb, 1-hour
+CREATE OR REPLACE MACRO presentation.aqi_no2(c) AS
+    CASE
+        WHEN c < 54 THEN presentation.aqi_interpolate(c, 0, 53, 0, 50)
+        WHEN c < 101 THEN presentation.aqi_interpolate(c, 54, 100, 51, 100)
+        WHEN c < 361 THEN presentation.aqi_interpolate(c, 101, 360, 101, 150)
+        WHEN c < 650 THEN presentation.aqi_interpolate(c, 361, 649, 151, 200)
+        WHEN c < 1250 THEN presentation.aqi_interpolate(c, 650, 1249, 201, 300)
+        WHEN c < 1650 THEN presentation.aqi_interpolate(c, 1250, 1649, 301, 400)
+        WHEN c >= 1650 THEN presentation.aqi_interpolate(c, 1650, 2049, 401, 500)
+    END;
+
+-- so2 in ppb, 1-hour
+CREATE OR REPLACE MACRO presentation.aqi_so2(c) AS
+    CASE
+        WHEN c < 36 THEN presentation.aqi_interpolate(c, 0, 35, 0, 50)
+        WHEN c < 76 THEN presentation.aqi_interpolate(c, 36, 75, 51, 100)
+        WHEN c < 186 THEN presentation.aqi_interpolate(c, 76, 185, 101, 150)
+        WHEN c < 305 THEN presentation.aqi_interpolate(c, 186, 304, 151, 200)
+        WHEN c < 605 THEN presentation.aqi_interpolate(c, 305, 604, 201, 300)
+        WHEN c < 805 THEN presentation.aqi_interpolate(c, 605, 804, 301, 400)
+        WHEN c >= 805 THEN presentation.aqi_interpolate(c, 805, 1004, 401, 500)
+    END;
+
+-- co in ppm, 8-hour
+CREATE OR REPLACE MACRO presentation.aqi_co(c) AS
+    CASE
+        WHEN c < 4.5 THEN presentation.aqi_interpolate(c, 0.0, 4.4, 0, 50)
+        WHEN c < 9.5 THEN presentation.aqi_interpolate(c, 4.5, 9.4, 51, 100)
+        WHEN c < 12.5 THEN presentation.aqi_interpolate(c, 9.5, 12.4, 101, 150)
+        WHEN c < 15.5 THEN presentation.aqi_interpolate(c, 12.5, 15.4, 151, 200)
+        WHEN c < 30.5 THEN presentation.aqi_interpolate(c, 15.5, 30.4, 201, 300)
+        WHEN c < 40.5 THEN presentation.aqi_interpolate(c, 30.5, 40.4, 301, 400)
+        WHEN c >= 40.5 THEN presentation.aqi_interpolate(c, 40.5, 50.4, 401, 500)
+    END;
+
+-- Convert a measurement to the units of its pollutant's table. Gases reported by mass
+-- (µg/m³, or mg/m³ for CO) are converted at 25 °C and 1 atm.
+CREATE OR REPLACE MACRO presentation.aqi_concentration(pollutant, concentration, units) AS
+    CASE
+        WHEN pollutant IN ('o3', 'no2', 'so2') AND units IN ('µg/m³', 'ug/m3') THEN
+            concentration * 24.45 / CASE pollutant WHEN 'o3' THEN 48.00 WHEN 'no2' THEN 46.01 ELSE 64.07 END
+                / CASE pollutant WHEN 'o3' THEN 1000 ELSE 1 END
+        WHEN pollutant = 'co' AND units IN ('µg/m³', 'ug/m3') THEN concentration * 24.45 / 28.01 / 1000
+        WHEN pollutant = 'co' AND units IN ('mg/m³', 'mg/m3') THEN concentration * 24.45 / 28.01
+        WHEN pollutant IN ('no2', 'so2') AND units = 'ppm' THEN concentration * 1000
+        WHEN pollutant IN ('o3', 'co') AND units = 'ppb' THEN concentration / 1000
+        ELSE concentration
+    END;
+
+-- AQI of a measurement in its reported units, NULL for pollutants without a breakpoint table
+CREATE OR REPLACE MACRO presentation.aqi(pollutant, concentration, units) AS
+    CASE pollutant
+        WHEN 'pm25' THEN presentation.aqi_pm25(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 1))
+        WHEN 'pm10' THEN presentation.aqi_pm10(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 0))
+        WHEN 'o3' THEN presentation.aqi_o3(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 3))
+        WHEN 'no2' THEN presentation.aqi_no2(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 0))
+        WHEN 'so2' THEN presentation.aqi_so2(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 0))
+        WHEN 'co' THEN presentation.aqi_co(presentation.aqi_truncate(presentation.aqi_concentration(pollutant, concentration, units), 1))
+    END;
+
+CREATE OR REPLACE MACRO presentation.aqi_category(aqi) AS
+    CASE
+        WHEN aqi <= 50 THEN 'Good'
+        WHEN aqi <= 100 THEN 'Moderate'
+        WHEN aqi <= 150 THEN 'Unhealthy for Sensitive Groups'
+        WHEN aqi <= 200 THEN 'Unhealthy'
+        WHEN aqi <= 300 THEN 'Very Unhealthy'
+        WHEN aqi > 300 THEN 'Hazardous'
+    END;
\ No newline at end of file
@@ -1,22 +1,13 @@
 CREATE OR REPLACE VIEW presentation.air_quality AS (
-    WITH ranked_data AS (
-        SELECT
-            *,
-            ROW_NUMBER() OVER (
-                PARTITION BY location_id, sensor_id, "datetime", "parameter"
-                ORDER BY ingestion_datetime DESC
-            ) AS rn
-        FROM raw.air_quality
-        WHERE parameter IN ('pm25')
-        AND "value" >= 0
-    )
+    -- raw.air_quality is upserted on (location_id, sensor_id, "datetime", "parameter"),
+    -- so it no longer needs a deduplication window here. raw.air_quality_all adds the rows
+    -- archived to Parquet by database_manager.py --archive-older-than
     SELECT
         location_id,
         sensor_id,
         "location",
         "datetime",
-        latitude AS lat,
-        longitude AS lon,
+        lat,
         lon,
         "parameter",
         units,
@@ -24,6 +15,8 @@ CREATE OR REPLACE VIEW presentation.air_quality AS (
         "month",
         "year",
         ingestion_datetime
-    FROM ranked_data
-    WHERE rn = 1
+    FROM raw.air_quality_all
+    JOIN raw.locations USING (location_id)
+    WHERE parameter IN ('pm25')
+    AND "value" >= 0
 );
\ No newline at end of file
@@ -0,0 +1,47 @@
+-- Materialized. Incremental runs only recompute locations with rows ingested after the
+-- previous refresh's watermark, full runs rebuild the table.
+{% if watermark is not none %}
+CREATE OR REPLACE TEMP TABLE latest_param_values_touched AS
+SELECT DISTINCT location_id
+FROM presentation.air_quality
+WHERE ingestion_datetime > TIMESTAMP '{{ watermark }}';
+
+DELETE FROM presentation.latest_param_values_per_location
+WHERE location_id IN (SELECT location_id FROM latest_param_values_touched);
+
+INSERT INTO presentation.latest_param_values_per_location
+{% else %}
+CREATE OR REPLACE TABLE presentation.latest_param_values_per_location AS
+{% endif %}
+WITH ranked_data AS (
+  SELECT
+    location_id,
+    location,
+    lat,
+    lon,
+    parameter,
+    value,
+    datetime,
+    ROW_NUMBER() OVER (PARTITION BY location_id, parameter ORDER BY datetime DESC) AS rn
+  FROM
+    presentation.air_quality
+  {% if watermark is not none %}
+  WHERE location_id IN (SELECT location_id FROM latest_param_values_touched)
+  {% endif %}
+)
+SELECT * FROM (
+  PIVOT (
+  	SELECT
+  		location_id,
+  	    location,
+  	    lat,
+  	    lon,
+  	    parameter,
+  	    value,
+  	    datetime
+  	FROM ranked_data
+  	WHERE rn = 1
+  )
+  ON parameter IN ('pm25')
+  USING FIRST("value")
+);
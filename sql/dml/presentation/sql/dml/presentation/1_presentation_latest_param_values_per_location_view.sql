@@ -1,28 +0,0 @@
-CREATE OR REPLACE VIEW presentation.latest_param_values_per_location AS
-WITH ranked_data AS (
-  SELECT
-    location_id,
-    location,
-    lat,
-    lon,
-    parameter,
-    value,
-    datetime,
-    ROW_NUMBER() OVER (PARTITION BY location_id, parameter ORDER BY datetime DESC) AS rn
-  FROM
-    presentation.air_quality
-)
-PIVOT (
-	SELECT
-		location_id,
-	    location,
-	    lat,
-	    lon,
-	    parameter,
-	    value,
-	    datetime
-	FROM ranked_data
-	WHERE rn = 1
-)
-ON parameter IN ('pm25')
-USING FIRST("value");
\ No newline at end of file
@@ -0,0 +1,70 @@
+-- Materialized. Incremental runs only recompute the location/day groups with rows ingested
+-- after the previous refresh's watermark, full runs rebuild the table.
+{% if watermark is not none %}
+CREATE OR REPLACE TEMP TABLE daily_air_quality_stats_touched AS
+SELECT DISTINCT location_id, CAST("datetime" AS DATE) AS measurement_date
+FROM presentation.air_quality
+WHERE ingestion_datetime > TIMESTAMP '{{ watermark }}';
+
+DELETE FROM presentation.daily_air_quality_stats AS stats
+USING daily_air_quality_stats_touched AS touched
+WHERE stats.location_id = touched.location_id
+AND stats.measurement_date = touched.measurement_date;
+
+INSERT INTO presentation.daily_air_quality_stats
+{% else %}
+CREATE OR REPLACE TABLE presentation.daily_air_quality_stats AS
+{% endif %}
+WITH air_quality_cte AS (
+    SELECT
+        location_id,
+        location,
+        CAST("datetime" AS DATE) AS measurement_date,
+        lat,
+        lon,
+        parameter,
+        units,
+        value,
+        dayofweek("datetime") AS weekday_number,
+        dayname("datetime") AS weekday,
+        CASE
+            WHEN dayname("datetime") = 'Saturday' OR dayname("datetime") = 'Sunday'
+            THEN 1
+            ELSE 0
+        END AS is_weekend
+    FROM presentation.air_quality
+    {% if watermark is not none %}
+    WHERE location_id IN (SELECT location_id FROM daily_air_quality_stats_touched)
+    AND "datetime" >= (SELECT min(measurement_date) FROM daily_air_quality_stats_touched)
+    {% endif %}
+)
+SELECT
+    location_id,
+    location,
+    measurement_date,
+    weekday_number,
+    weekday,
+    is_weekend,
+    lat,
+    lon,
+    parameter,
+    units,
+    AVG(value) AS average_value,
+    MIN(value) AS min_value,
+    MAX(value) AS max_value,
+    presentation.aqi(parameter, AVG(value), units) AS aqi
+FROM air_quality_cte
+{% if watermark is not none %}
+SEMI JOIN daily_air_quality_stats_touched USING (location_id, measurement_date)
+{% endif %}
+GROUP BY
+    location_id,
+    location,
+    measurement_date,
+    weekday_number,
+    weekday,
+    is_weekend,
+    lat,
+    lon,
+    parameter,
+    units;
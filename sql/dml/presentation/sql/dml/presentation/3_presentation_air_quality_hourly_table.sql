@@ -0,0 +1,74 @@
+-- Hourly rollup per location and parameter, the finest level of the rollup store. Daily and
+-- monthly rollups are built from it, never from raw rows. Incremental runs only recompute the
+-- hours with rows ingested after the previous refresh's watermark.
+{% if watermark is not none %}
+CREATE OR REPLACE TEMP TABLE air_quality_hourly_touched AS
+SELECT DISTINCT location_id, parameter, date_trunc('hour', "datetime") AS period_start
+FROM presentation.air_quality
+WHERE ingestion_datetime > TIMESTAMP '{{ watermark }}';
+
+DELETE FROM presentation.air_quality_hourly AS rollup
+USING air_quality_hourly_touched AS touched
+WHERE rollup.location_id = touched.location_id
+AND rollup.parameter = touched.parameter
+AND rollup.period_start = touched.period_start;
+
+INSERT INTO presentation.air_quality_hourly
+{% else %}
+CREATE OR REPLACE TABLE presentation.air_quality_hourly AS
+{% endif %}
+WITH readings AS (
+    SELECT
+        location_id,
+        parameter,
+        units,
+        date_trunc('hour', "datetime") AS period_start,
+        value,
+        ingestion_datetime
+    FROM presentation.air_quality
+    {% if watermark is not none %}
+    WHERE location_id IN (SELECT location_id FROM air_quality_hourly_touched)
+    AND "datetime" >= (SELECT min(period_start) FROM air_quality_hourly_touched)
+    {% endif %}
+),
+touched_readings AS (
+    SELECT *
+    FROM readings
+    {% if watermark is not none %}
+    SEMI JOIN air_quality_hourly_touched USING (location_id, parameter, period_start)
+    {% endif %}
+),
+sketches AS (
+    SELECT
+        location_id,
+        parameter,
+        period_start,
+        list({'bucket': bucket, 'bucket_count': bucket_count}) AS sketch
+    FROM (
+        SELECT
+            location_id,
+            parameter,
+            period_start,
+            presentation.sketch_bucket(value) AS bucket,
+            count(*) AS bucket_count
+        FROM touched_readings
+        GROUP BY location_id, parameter, period_start, bucket
+    )
+    GROUP BY location_id, parameter, period_start
+)
+SELECT
+    location_id,
+    parameter,
+    any_value(units) AS units,
+    period_start,
+    count(*) AS value_count,
+    sum(value) AS value_sum,
+    min(value) AS value_min,
+    max(value) AS value_max,
+    presentation.sketch_quantile(any_value(sketch), 0.5) AS p50,
+    presentation.sketch_quantile(any_value(sketch), 0.95) AS p95,
+    any_value(sketch) AS sketch,
+    max(ingestion_datetime) AS last_ingestion_datetime
+FROM touched_readings
+JOIN sketches USING (location_id, parameter, period_start)
+GROUP BY location_id, parameter, period_start;
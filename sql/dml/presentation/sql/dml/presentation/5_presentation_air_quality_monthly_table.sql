@@ -0,0 +1,71 @@
+-- Monthly rollup per location and parameter, merged from the daily rollup. Incremental runs only
+-- recompute the months holding days refreshed after the previous refresh's watermark.
+{% if watermark is not none %}
+CREATE OR REPLACE TEMP TABLE air_quality_monthly_touched AS
+SELECT DISTINCT location_id, parameter, CAST(date_trunc('month', period_start) AS TIMESTAMP) AS period_start
+FROM presentation.air_quality_daily
+WHERE last_ingestion_datetime > TIMESTAMP '{{ watermark }}';
+
+DELETE FROM presentation.air_quality_monthly AS rollup
+USING air_quality_monthly_touched AS touched
+WHERE rollup.location_id = touched.location_id
+AND rollup.parameter = touched.parameter
+AND rollup.period_start = touched.period_start;
+
+INSERT INTO presentation.air_quality_monthly
+{% else %}
+CREATE OR REPLACE TABLE presentation.air_quality_monthly AS
+{% endif %}
+WITH finer AS (
+    SELECT * REPLACE (CAST(date_trunc('month', period_start) AS TIMESTAMP) AS period_start)
+    FROM presentation.air_quality_daily
+    {% if watermark is not none %}
+    WHERE location_id IN (SELECT location_id FROM air_quality_monthly_touched)
+    AND period_start >= (SELECT min(period_start) FROM air_quality_monthly_touched)
+    {% endif %}
+),
+touched_finer AS (
+    SELECT *
+    FROM finer
+    {% if watermark is not none %}
+    SEMI JOIN air_quality_monthly_touched USING (location_id, parameter, period_start)
+    {% endif %}
+),
+-- Sketches merge by summing the counts of matching buckets
+sketches AS (
+    SELECT
+        location_id,
+        parameter,
+        period_start,
+        list({'bucket': bucket, 'bucket_count': bucket_count}) AS sketch
+    FROM (
+        SELECT
+            location_id,
+            parameter,
+            period_start,
+            entry.bucket AS bucket,
+            CAST(sum(entry.bucket_count) AS BIGINT) AS bucket_count
+        FROM (
+            SELECT location_id, parameter, period_start, unnest(sketch) AS entry
+            FROM touched_finer
+        )
+        GROUP BY location_id, parameter, period_start, bucket
+    )
+    GROUP BY location_id, parameter, period_start
+)
+SELECT
+    location_id,
+    parameter,
+    any_value(units) AS units,
+    period_start,
+    CAST(sum(value_count) AS BIGINT) AS value_count,
+    sum(value_sum) AS value_sum,
+    min(value_min) AS value_min,
+    max(value_max) AS value_max,
+    presentation.sketch_quantile(any_value(sketches.sketch), 0.5) AS p50,
+    presentation.sketch_quantile(any_value(sketches.sketch), 0.95) AS p95,
+    any_value(sketches.sketch) AS sketch,
+    max(last_ingestion_datetime) AS last_ingestion_datetime
+FROM touched_finer
+JOIN sketches USING (location_id, parameter, period_start)
+GROUP BY location_id, parameter, period_start;
@@ -0,0 +1,11 @@
+-- Small metadata table the dashboard reads at startup instead of scanning measurements.
+-- One row per location and parameter, rebuilt in full since it is tiny.
+CREATE OR REPLACE TABLE presentation.dashboard_catalog AS
+SELECT
+    location,
+    parameter,
+    min(measurement_date) AS start_date,
+    max(measurement_date) AS end_date
+FROM presentation.daily_air_quality_stats
+GROUP BY location, parameter
+ORDER BY location, parameter;
\ No newline at end of file
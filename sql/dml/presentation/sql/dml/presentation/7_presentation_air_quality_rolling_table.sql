@@ -0,0 +1,117 @@
+-- Rolling metrics per sensor and hour, for every hour a sensor reported in:
+--   mean_24h: mean of the hourly means of the last 24 hours, NULL with fewer than 18 of them
+--   nowcast:  EPA NowCast for particulates, the mean of the last 12 hourly means weighted by
+--             w^age with w = max(min / max, 0.5), NULL unless 2 of the last 3 hours reported.
+--             NULL for other parameters, whose NowCast uses other weights
+-- A new reading changes the windows of the 24 hours starting at its hour, so incremental runs
+-- only recompute those hours of the sensors with rows ingested after the previous watermark.
+{% if watermark is not none %}
+CREATE OR REPLACE TEMP TABLE air_quality_rolling_touched AS
+SELECT DISTINCT location_id, sensor_id, parameter, date_trunc('hour', "datetime") AS touched_hour
+FROM presentation.air_quality
+WHERE ingestion_datetime > TIMESTAMP '{{ watermark }}';
+
+DELETE FROM presentation.air_quality_rolling AS rolling
+USING air_quality_rolling_touched AS touched
+WHERE rolling.location_id = touched.location_id
+AND rolling.sensor_id = touched.sensor_id
+AND rolling.parameter = touched.parameter
+AND rolling.period_start BETWEEN touched.touched_hour AND touched.touched_hour + INTERVAL 23 HOUR;
+
+INSERT INTO presentation.air_quality_rolling
+{% else %}
+CREATE OR REPLACE TABLE presentation.air_quality_rolling AS
+{% endif %}
+WITH hourly AS (
+    SELECT
+        location_id,
+        sensor_id,
+        parameter,
+        any_value(units) AS units,
+        date_trunc('hour', "datetime") AS period_start,
+        count(*) AS value_count,
+        avg(value) AS value,
+        max(ingestion_datetime) AS last_ingestion_datetime
+    FROM presentation.air_quality
+    {% if watermark is not none %}
+    -- Readings of the recomputed hours and of the 23 hours their windows reach back
+    SEMI JOIN (
+        SELECT
+            location_id,
+            sensor_id,
+            parameter,
+            min(touched_hour) - INTERVAL 23 HOUR AS first_hour,
+            max(touched_hour) + INTERVAL 24 HOUR AS end_hour
+        FROM air_quality_rolling_touched
+        GROUP BY location_id, sensor_id, parameter
+    ) AS series
+    ON air_quality.location_id = series.location_id
+    AND air_quality.sensor_id = series.sensor_id
+    AND air_quality.parameter = series.parameter
+    AND air_quality."datetime" >= series.first_hour
+    AND air_quality."datetime" < series.end_hour
+    {% endif %}
+    GROUP BY location_id, sensor_id, parameter, period_start
+),
+windows AS (
+    SELECT
+        *,
+        avg(value) OVER last_24_hours AS window_24h_mean,
+        count(*) OVER last_24_hours AS hours_24h,
+        list(value) OVER last_12_hours AS values_12h,
+        list(period_start) OVER last_12_hours AS hours_12h
+    FROM hourly
+    WINDOW
+        last_24_hours AS (
+            PARTITION BY location_id, sensor_id, parameter
+            ORDER BY period_start
+            RANGE BETWEEN INTERVAL 23 HOUR PRECEDING AND CURRENT ROW
+        ),
+        last_12_hours AS (
+            PARTITION BY location_id, sensor_id, parameter
+            ORDER BY period_start
+            RANGE BETWEEN INTERVAL 11 HOUR PRECEDING AND CURRENT ROW
+        )
+),
+nowcast_inputs AS (
+    SELECT
+        * EXCLUDE (hours_12h),
+        list_transform(hours_12h, hour -> date_diff('hour', hour, period_start)) AS ages_12h,
+        -- All-zero windows have no min / max ratio, every weight is then 1
+        coalesce(greatest(list_min(values_12h) / nullif(list_max(values_12h), 0), 0.5), 1.0) AS weight
+    FROM windows
+),
+rolling AS (
+    SELECT
+        location_id,
+        sensor_id,
+        parameter,
+        units,
+        period_start,
+        value_count,
+        value,
+        CASE WHEN hours_24h >= 18 THEN window_24h_mean END AS mean_24h,
+        hours_24h,
+        CASE WHEN parameter IN ('pm25', 'pm10') AND len(list_filter(ages_12h, age -> age <= 2)) >= 2 THEN
+            list_sum(list_transform(range(1, len(ages_12h) + 1), i -> pow(weight, ages_12h[i]) * values_12h[i]))
+                / list_sum(list_transform(ages_12h, age -> pow(weight, age)))
+        END AS nowcast,
+        last_ingestion_datetime
+    FROM nowcast_inputs
+)
+SELECT
+    *,
+    presentation.aqi(parameter, mean_24h, units) AS aqi_24h,
+    presentation.aqi(parameter, nowcast, units) AS aqi_nowcast
+FROM rolling
+{% if watermark is not none %}
+WHERE EXISTS (
+    SELECT 1
+    FROM air_quality_rolling_touched AS touched
+    WHERE touched.location_id = rolling.location_id
+    AND touched.sensor_id = rolling.sensor_id
+    AND touched.parameter = rolling.parameter
+    AND rolling.period_start BETWEEN touched.touched_hour AND touched.touched_hour + INTERVAL 23 HOUR
+)
+{% endif %}
+ORDER BY location_id, sensor_id, parameter, period_start;
@@ -0,0 +1,53 @@
+-- Latest PM2.5 of every location binned into Web Mercator grid cells for each map zoom level
+-- from 0 to 14. Every map tile of a level is split into 8 x 8 cells of about 32 pixels, so a
+-- viewport holds a bounded number of cells however many locations it covers. Cells take the
+-- worst AQI of their locations, the NowCast AQI where there is one. Rebuilt in full, it is a
+-- few rows per location.
+CREATE OR REPLACE TABLE presentation.map_cells AS
+WITH locations AS (
+    SELECT
+        latest.location,
+        latest.lat,
+        latest.lon,
+        -- Mercator is undefined at the poles, tiles stop at 85.0511 degrees
+        least(greatest(latest.lat, -85.0511), 85.0511) AS mercator_lat,
+        latest."datetime",
+        -- Locations without a PM2.5 value are drawn as 0, as the map did before binning
+        coalesce(latest.pm25, 0.0) AS pm25,
+        coalesce(nowcast.aqi_nowcast, presentation.aqi('pm25', coalesce(latest.pm25, 0.0), NULL)) AS aqi
+    FROM presentation.latest_param_values_per_location AS latest
+    LEFT JOIN (
+        SELECT location_id, arg_max(aqi_nowcast, period_start) AS aqi_nowcast
+        FROM presentation.air_quality_rolling
+        WHERE parameter = 'pm25'
+        AND aqi_nowcast IS NOT NULL
+        GROUP BY location_id
+    ) AS nowcast USING (location_id)
+    WHERE latest.lat IS NOT NULL
+    AND latest.lon IS NOT NULL
+),
+binned AS (
+    SELECT
+        CAST(zoom AS UTINYINT) AS zoom,
+        CAST(floor((lon + 180) / 360 * pow(2, zoom + 3)) AS INTEGER) AS cell_x,
+        CAST(floor(
+            (1 - ln(tan(radians(mercator_lat)) + 1 / cos(radians(mercator_lat))) / pi()) / 2 * pow(2, zoom + 3)
+        ) AS INTEGER) AS cell_y,
+        locations.*
+    FROM locations
+    CROSS JOIN range(0, 15) AS zooms(zoom)
+)
+SELECT
+    zoom,
+    cell_x,
+    cell_y,
+    count(*) AS location_count,
+    CASE WHEN count(*) = 1 THEN any_value(location) ELSE count(*) || ' locations' END AS location,
+    avg(lat) AS latitude,
+    avg(lon) AS longitude,
+    max("datetime") AS "datetime",
+    avg(pm25) AS pm25,
+    max(aqi) AS aqi
+FROM binned
+GROUP BY zoom, cell_x, cell_y
+ORDER BY zoom, cell_x, cell_y;
@@ -1,9 +1,9 @@
-INSERT INTO raw.air_quality
+INSERT INTO {{ target_table }} BY NAME
 SELECT 
     location_id, 
-    sensors_id, 
+    sensors_id AS sensor_id, 
     "location", 
-    "datetime", 
+    CAST("datetime" AS TIMESTAMP) AS "datetime", 
     lat, 
     lon, 
     "parameter", 
@@ -12,4 +12,22 @@ SELECT
     "month", 
     "year",
     current_timestamp AS ingestion_datetime
-FROM read_csv('{{ data_file_path }}');
\ No newline at end of file
+FROM read_csv(
+    [{% for data_file in data_files %}'{{ data_file }}'{% if not loop.last %}, {% endif %}{% endfor %}],
+    header = true,
+    auto_detect = false,
+    compression = 'gzip',
+    columns = {
+        'location_id': 'BIGINT',
+        'sensors_id': 'BIGINT',
+        'location': 'VARCHAR',
+        'datetime': 'TIMESTAMPTZ',
+        'lat': 'DOUBLE',
+        'lon': 'DOUBLE',
+        'parameter': 'VARCHAR',
+        'units': 'VARCHAR',
+        'value': 'DOUBLE'
+    },
+    hive_partitioning = true,
+    hive_types = {'locationid': 'BIGINT', 'year': 'SMALLINT', 'month': 'UTINYINT'}
+);
\ No newline at end of file